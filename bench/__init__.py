@@ -0,0 +1 @@
+"""Tools to measure the server's performance."""
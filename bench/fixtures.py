@@ -0,0 +1,3 @@
+"""Sample messages, used by the benchmarks."""
+
+VALID = b"find,1.0.0,11111,Red,1492491670,POKEMONTRAINER_Red2,0,0,6,ARIADOS,100,956015172,1492491670,Red,0,800000,0,BLACKSLUDGE,4,TOXICTHREAD,0,TOXICSPIKES,0,STICKYWEB,0,FELLSTINGER,0,4,TOXICTHREAD,TOXICSPIKES,STICKYWEB,FELLSTINGER,0,false,TERRITORIAL,0,JOLLY,,31,,252,31,,252,31,,0,0,,0,31,,0,31,,4,50,Maguire,POKEBALL,0,0,0,1,,100,0,0,0,0,0,0,0,0,232,0,false,true,POISON,false,false,PIDGEOT,100,1306161730,1492491670,Red,0,1059860,0,PIDGEOTITE,4,AIRSLASH,0,TAILWIND,0,HURRICANE,0,HEATWAVE,0,4,AIRSLASH,TAILWIND,HURRICANE,HEATWAVE,1,false,BIGWINGS,0,TIMID,,31,,4,0,,0,31,,0,31,,252,31,,0,31,,252,50,Tsubasa,POKEBALL,0,0,0,1,,100,0,0,0,0,0,0,0,0,228,0,false,true,NORMAL,false,false,LANTURN,100,969756750,1492491670,Red,0,1250000,0,LEFTOVERS,4,CHINCHOUTRAP,0,SURF,0,VOLTSWITCH,0,TOXIC,0,4,CHINCHOUTRAP,SURF,VOLTSWITCH,TOXIC,1,false,VOLTABSORB,0,BOLD,,31,,252,0,,0,31,,4,31,,252,31,,0,31,,0,50,Lumine,POKEBALL,0,0,0,1,,100,0,0,0,0,0,0,0,0,165,0,false,true,ELECTRIC,false,false,PERSIAN,100,2215317754,1492491670,Red,0,1000000,0,CHOICEBAND,4,FORTUNA,0,UTURN,0,KNOCKOFF,0,GIGAIMPACT,0,4,FORTUNA,UTURN,KNOCKOFF,GIGAIMPACT,0,false,LIMBER,0,JOLLY,,31,,4,31,,252,31,,0,0,,0,31,,0,31,,252,50,MoneyTrees,POKEBALL,0,0,0,1,,100,0,0,0,0,0,0,0,0,154,0,false,true,NORMAL,false,false,XATU,100,2515801800,1492491670,Red,0,1000000,0,PUMPKINBERRY,4,TRICKROOM,0,TELEPORT,0,GRANPREDICCION,0,WILLOWISP,0,4,TRICKROOM,TELEPORT,GRANPREDICCION,WILLOWISP,0,false,MAGICBOUNCE,0,BOLD,,31,,252,0,,0,31,,252,31,,4,31,,0,0,,0,50,2600,POKEBALL,0,0,0,1,,100,0,0,0,0,0,0,0,0,158,0,false,true,FLYING,false,false,ARMALDO,100,827703838,1492491670,Red,0,600000,0,EXPERTBELT,4,RAPIDSPIN,0,PIERCEPINCER,0,FIRSTIMPRESSION,0,ROCKSLIDE,0,4,RAPIDSPIN,PIERCEPINCER,FIRSTIMPRESSION,ROCKSLIDE,1,false,BATTLEARMOR,0,ADAMANT,,31,,252,31,,252,31,,4,0,,0,31,,0,0,,0,50,Bandit,POKEBALL,0,0,0,1,,100,0,0,0,0,0,0,0,0,136,0,false,true,ROCK,false,false"  # noqa: E501
@@ -0,0 +1,353 @@
+"""Put a server under load, with simulated pairs of trainers.
+
+Every pair sends its ``find`` messages (the test fixture, with tweaked ids), and once
+matched, both trainers keep sending battle messages to each other at a fixed rate.
+
+By default, a server is started on a separate process, so that its CPU time and
+memory usage can be reported. Use ``--address`` to target a running server instead.
+
+Usage: ``python -m bench.loadgen --pairs 1000 --duration 10``
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import resource
+import statistics
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from bench import utils as bench_utils
+from cable_club.network.aio import AsyncServer
+from cable_club.network.server import Server
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+    from cable_club.config import Config
+    from cable_club.network.server import BaseServer
+
+
+SERVERS: dict[str, type[BaseServer]] = {
+    "sync": Server,
+    "asyncio": AsyncServer,
+}
+
+MAX_PAIRS = 0x7FFF
+"""Ids are trimmed to 16 bits when matching, they have to be unique."""
+
+CONNECT_TIMEOUT = 10.0
+"""Seconds to wait for the server to start accepting connections."""
+
+STOP_TIMEOUT = 5.0
+"""Seconds that the server's process has to exit, before being killed."""
+
+
+def usage() -> tuple[float, int]:
+    """CPU seconds used by this process and its (finished) children, and its RSS.
+
+    Peak RSS is in KiB, and only accounts for this process.
+    """
+    cpu = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        rusage = resource.getrusage(who)
+        cpu += rusage.ru_utime + rusage.ru_stime
+    return cpu, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def serve(config: Config, connection: Connection) -> None:
+    """Run a server until asked to stop, then report its resource usage.
+
+    Runs on a separate process, with the server on a background thread. The
+    validation pool is shut down before reporting, so that its CPU time counts.
+    """
+    server = SERVERS[config.server_backend](config)
+    threading.Thread(target=server.run, daemon=True).start()
+
+    connection.send(usage())
+    connection.recv()
+    server.stop_pool()
+    connection.send(usage())
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    """Summarize some latencies, in milliseconds."""
+    if len(values) < 2:  # noqa: PLR2004
+        return {}
+
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50": cuts[49] * 1000,
+        "p90": cuts[89] * 1000,
+        "p99": cuts[98] * 1000,
+        "max": max(values) * 1000,
+    }
+
+
+class Stats:
+    """Measurements taken by the simulated trainers."""
+
+    def __init__(self) -> None:
+        """Initialize an instance."""
+        self.handshakes: list[float] = []
+        """Seconds from connecting to receiving ``found``."""
+        self.relays: list[float] = []
+        """Seconds for a battle message to reach the peer."""
+        self.relayed_bytes = 0
+        self.errors = 0
+        self.battling: list[float] = []
+        """Seconds that each pair spent battling."""
+
+
+class Trainer:
+    """A simulated player."""
+
+    def __init__(self, id_: int, peer_id: int, stats: Stats) -> None:
+        """Initialize an instance."""
+        self.find = bench_utils.find_message(peer_id=peer_id, id_=id_)
+        self.stats = stats
+        self.reader: asyncio.StreamReader
+        self.writer: asyncio.StreamWriter
+
+    async def connect(self, host: str, port: int) -> None:
+        """Open the connection and ask for a match, wait until found."""
+        start = time.perf_counter()
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(self.find)
+
+        line = await self.reader.readline()
+        if not line.startswith(b"found,"):
+            msg = f"Not matched: {line[:80]!r}"
+            raise ConnectionError(msg)
+        self.stats.handshakes.append(time.perf_counter() - start)
+
+    async def send(self, rate: float, until: float) -> None:
+        """Send timestamped battle messages, at a fixed rate."""
+        interval = 1 / rate
+        deadline = time.perf_counter()
+        while deadline < until:
+            self.writer.write(f"turn,{time.perf_counter()}\n".encode())
+            await self.writer.drain()
+
+            deadline += interval
+            await asyncio.sleep(max(0, deadline - time.perf_counter()))
+
+        self.writer.write(b"done\n")
+        await self.writer.drain()
+
+    async def receive(self) -> None:
+        """Measure the messages relayed from the peer, until it is done."""
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                msg = "Connection closed while battling"
+                raise ConnectionError(msg)
+            if line == b"done\n":
+                return
+            sent = float(line.split(b",")[1])
+            self.stats.relays.append(time.perf_counter() - sent)
+            self.stats.relayed_bytes += len(line)
+
+    def close(self) -> None:
+        """Close the connection."""
+        if hasattr(self, "writer"):
+            self.writer.close()
+
+
+async def battle(  # noqa: PLR0913
+    index: int,
+    host: str,
+    port: int,
+    *,
+    rate: float,
+    duration: float,
+    stats: Stats,
+) -> None:
+    """Match two trainers, then relay messages between them for a while."""
+    red_id, blue_id = 2 * index + 1, 2 * index + 2
+    red = Trainer(red_id, blue_id, stats)
+    blue = Trainer(blue_id, red_id, stats)
+
+    try:
+        await asyncio.gather(red.connect(host, port), blue.connect(host, port))
+
+        start = time.perf_counter()
+        until = start + duration
+        tasks = [
+            red.send(rate, until),
+            blue.send(rate, until),
+            # grace period for the messages in flight
+            asyncio.wait_for(red.receive(), duration + 1),
+            asyncio.wait_for(blue.receive(), duration + 1),
+        ]
+        await asyncio.gather(*tasks)
+        stats.battling.append(time.perf_counter() - start)
+    except (OSError, asyncio.TimeoutError):
+        stats.errors += 1
+    finally:
+        red.close()
+        blue.close()
+
+
+async def wait_until_up(host: str, port: int) -> None:
+    """Retry connecting until the server accepts connections."""
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:  # noqa: PERF203
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+        else:
+            writer.close()
+            return
+
+
+async def generate(args: argparse.Namespace, host: str, port: int) -> dict[str, object]:
+    """Run every pair concurrently, and summarize the results."""
+    await wait_until_up(host, port)
+
+    stats = Stats()
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            battle(
+                index,
+                host,
+                port,
+                rate=args.rate,
+                duration=args.duration,
+                stats=stats,
+            )
+            for index in range(args.pairs)
+        ),
+    )
+    elapsed = time.perf_counter() - start
+
+    # pairs battle concurrently, throughput is measured over their average battle
+    battling = statistics.fmean(stats.battling) if stats.battling else elapsed
+
+    return {
+        "pairs": args.pairs,
+        "matched": len(stats.handshakes) // 2,
+        "errors": stats.errors,
+        "handshake_ms": percentiles(stats.handshakes),
+        "relay_ms": percentiles(stats.relays),
+        "relayed_messages_per_second": len(stats.relays) / battling,
+        "relayed_bytes_per_second": stats.relayed_bytes / battling,
+        "elapsed_seconds": elapsed,
+    }
+
+
+def run(args: argparse.Namespace) -> dict[str, object]:
+    """Start a server (unless targetting an existing one), and put it under load."""
+    if args.address:
+        host, port = args.address.rsplit(":", 1)
+        return asyncio.run(generate(args, host, int(port)))
+
+    config = bench_utils.server_config(
+        PORT=bench_utils.free_port(),
+        SERVER_BACKEND=args.backend,
+        HANDOFF_SOCKET="",
+        MAX_CONNECTIONS_PER_IP=0,
+        LISTEN_BACKLOG=max(1024, 2 * args.pairs),
+        VALIDATION_WORKERS=args.validation_workers,
+        RAW_RELAY=args.raw_relay,
+    )
+
+    ctx = multiprocessing.get_context("spawn")
+    connection, child = ctx.Pipe()
+    # not a daemon, those can not start the validation pool
+    process = ctx.Process(target=serve, args=(config, child))
+    process.start()
+    # otherwise, recv() would wait forever if the server dies, rather than failing
+    child.close()
+    try:
+        cpu_before, _ = connection.recv()
+        report = asyncio.run(generate(args, config.host, config.port))
+        connection.send("stop")
+        cpu_after, max_rss = connection.recv()
+    except EOFError as e:
+        msg = f"Server's process exited (code {process.exitcode}), see its output"
+        raise RuntimeError(msg) from e
+    finally:
+        process.terminate()
+        process.join(STOP_TIMEOUT)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    report["server_cpu_seconds"] = cpu_after - cpu_before
+    report["server_max_rss_kib"] = max_rss
+    return report
+
+
+def raise_fd_limit(pairs: int) -> None:
+    """Allow as many sockets as needed (two per pair), if possible."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = 2 * pairs + 64
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Read the options from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=100, help="pairs of trainers")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=10.0,
+        help="battle messages sent per trainer per second",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=5.0,
+        help="seconds of battle, once matched",
+    )
+    parser.add_argument("--backend", choices=SERVERS, default="sync")
+    parser.add_argument("--validation-workers", type=int, default=0)
+    parser.add_argument("--raw-relay", action="store_true")
+    parser.add_argument(
+        "--address",
+        help="host:port of a running server, instead of starting one",
+    )
+    parser.add_argument("--json", action="store_true", help="output as JSON")
+
+    args = parser.parse_args(argv)
+    if not 0 < args.pairs <= MAX_PAIRS:
+        parser.error(f"--pairs must be between 1 and {MAX_PAIRS}")
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Entrypoint of the load generator."""
+    args = parse_args(argv)
+    raise_fd_limit(args.pairs)
+    report = run(args)
+
+    if args.json:
+        print(json.dumps(report, indent=2))  # noqa: T201
+        return
+
+    for key, value in report.items():
+        if isinstance(value, dict):
+            text = ", ".join(f"{k}={v:.2f}" for k, v in value.items())
+        elif isinstance(value, float):
+            text = f"{value:.2f}"
+        else:
+            text = str(value)
+        print(f"{key:>28}: {text}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""Time the hot functions of the data layer on their own.
+
+Every case runs in batches long enough for the clock's resolution not to matter,
+with the garbage collector disabled, and reports the best and median time per
+operation. Results can be saved as JSON, and compared against a previous run.
+
+PBS files are read from ``--pbs-dir`` (the game's folder), they must know about
+everything on the test fixture. Padded copies of them are generated, to see how
+the size of the game's data affects :py:func:`models.configure`.
+
+Usage::
+
+    python -m bench.micro --output before.json
+    # ... changes ...
+    python -m bench.micro --compare before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import functools
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+from bench import fixtures
+from bench import utils as bench_utils
+from cable_club import constants, utils
+from cable_club.data import fields, models
+from cable_club.data.reader import Reader
+from cable_club.data.writer import Writer
+from cable_club.network.states import check_find
+from cable_club.version import Version
+from cable_club.watcher import load_rules
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator
+    from contextlib import AbstractContextManager
+
+T = TypeVar("T")
+
+HEADER = ("find", "version", "peer", "name", "id", "trainertype", "win", "lose")
+"""Fields of a ``find`` message before the party."""
+
+ESCAPED = fixtures.VALID.replace(b"Red", b"R\\\\e\\,d")
+"""Fixture with some escaped backslashes and commas."""
+
+FIELDS = 1000
+"""Fields on the readers used to time ``consume_*``."""
+
+PADDING = (0, 1000, 10000)
+"""Extra sections added to the PBS files."""
+
+RULES = (10, 100)
+"""Amount of files on the rules folder."""
+
+
+class Case(Generic[T]):
+    """Something to be timed.
+
+    ``setup`` prepares the argument for each call to ``run``, it is not timed.
+    Neither is ``context``, entered while measuring.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[T], object],
+        setup: Callable[[], T],
+        ops: int = 1,
+        context: Callable[[], AbstractContextManager[object]] = contextlib.nullcontext,
+    ) -> None:
+        """Initialize an instance, ``ops`` is the amount of operations per run."""
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.ops = ops
+        self.context = context
+
+    def sample(self, number: int) -> int:
+        """Total nanoseconds spent on some runs."""
+        total = 0
+        for _ in range(number):
+            arg = self.setup()
+            start = time.perf_counter_ns()
+            self.run(arg)
+            total += time.perf_counter_ns() - start
+        return total
+
+    def measure(self, repeat: int, min_time: float) -> dict[str, float]:
+        """Time per operation, in nanoseconds."""
+        with self.context():
+            # grow the batch until it takes long enough (also warms caches up)
+            number = 1
+            while self.sample(number) < min_time * 1e9:
+                number *= 2
+
+            samples = [self.sample(number) for _ in range(repeat)]
+
+        per_op = [sample / (number * self.ops) for sample in samples]
+        return {
+            "min_ns": min(per_op),
+            "median_ns": statistics.median(per_op),
+            "runs": number * repeat,
+        }
+
+
+@contextlib.contextmanager
+def reference_parsers() -> Generator[None, None, None]:
+    """Parse through the fields, rather than the generated parsers."""
+    parsers = dict(models.parsers)
+    models.parsers.clear()
+    try:
+        yield
+    finally:
+        models.parsers.update(parsers)
+
+
+@contextlib.contextmanager
+def no_validation() -> Generator[None, None, None]:
+    """Replace every check on fields and models with a noop.
+
+    Only has an effect on the fields, generated parsers are not used meanwhile.
+    """
+    classes: list[type] = [models.Model, fields.Base]
+    patched = []
+    while classes:
+        cls = classes.pop()
+        classes.extend(cls.__subclasses__())
+        if "validate" in vars(cls):
+            patched.append((cls, vars(cls)["validate"]))
+            cls.validate = utils.noop  # type: ignore[attr-defined]
+
+    try:
+        with reference_parsers():
+            yield
+    finally:
+        for cls, validate in patched:
+            cls.validate = validate  # type: ignore[attr-defined]
+
+
+def identity(value: T) -> T:
+    """Return the value, as the setup of cases whose argument does not change."""
+    return value
+
+
+def new_reader(raw: bytes) -> Reader:
+    """Create a reader, it must not fail."""
+    reader = Reader.new(raw)
+    if reader is None:
+        msg = f"Invalid input: {raw[:50]!r}"
+        raise ValueError(msg)
+    return reader
+
+
+def party_reader() -> Reader:
+    """Reader at the point where the server starts parsing the party."""
+    reader = new_reader(fixtures.VALID)
+    for _ in HEADER:
+        reader.consume()
+    return reader
+
+
+def consume_all(method: Callable[[Reader], object]) -> Callable[[Reader], None]:
+    """Call a ``consume_*`` method for each field on the reader."""
+
+    def run(reader: Reader) -> None:
+        for _ in range(FIELDS):
+            method(reader)
+
+    return run
+
+
+def encode_found(party_raw: bytes) -> bytes:
+    """Build a ``found`` message, like the server does when matching."""
+    writer = Writer()
+    writer.add("found")
+    writer.add(0)
+    for field in ("Red", "POKEMONTRAINER_Red", "I won!", "I lost..."):
+        writer.add(field)
+    writer.splice(party_raw)
+    return writer.encode()
+
+
+def pad_pbs(source: Path, target: Path, extra: int) -> None:
+    """Copy the PBS files, with some made up sections at the end."""
+    target.mkdir()
+    for name in (
+        constants.ABILITIES_FILE,
+        constants.ITEMS_FILE,
+        constants.MOVES_FILE,
+        constants.POKEMONS_FILE,
+    ):
+        lines = [(source / name).read_text(encoding=constants.UTF8_SIG)]
+        for i in range(extra):
+            lines.append(f"[PADDING{i}]\nname=PADDING{i}\n")
+            if name == constants.POKEMONS_FILE:
+                lines.append("abilities=\ngender_ratio=Genderless\nmoves=\n")
+        (target / name).write_text("".join(lines), encoding=constants.UTF8)
+
+
+def write_rules(target: Path, amount: int) -> dict[Path, float]:
+    """Create a rules folder, return its "hash" (see :py:mod:`cable_club.watcher`)."""
+    target.mkdir()
+    for i in range(amount):
+        lines = [f"Rule {i}", "1", "6", ",".join(f"CLAUSE{j}" for j in range(20))]
+        (target / f"rule{i}.txt").write_text("\n".join(lines) + "\n")
+    return {f: f.stat().st_mtime for f in target.iterdir()}
+
+
+def cases(pbs_dir: Path, workdir: Path) -> list[Case[Any]]:
+    """Everything to be timed."""
+    ints = b",".join(b"%d" % i for i in range(FIELDS))
+    optional_ints = b",".join(b"%d," % i for i in range(FIELDS // 2))
+    bools = b",".join([b"true", b"false"] * (FIELDS // 2))
+    party_raw = party_reader().raw_all()
+    party_encoded = Writer.encode_fields(party_raw)
+    version = Version("1.0.0")
+
+    all_cases: list[Case[Any]] = [
+        Case("reader.new", Reader.new, lambda: fixtures.VALID),
+        Case("reader.new[escaped]", Reader.new, lambda: ESCAPED),
+        Case(
+            "reader.consume",
+            consume_all(Reader.consume),
+            lambda: new_reader(ints),
+            FIELDS,
+        ),
+        Case(
+            "reader.consume_int",
+            consume_all(Reader.consume_int),
+            lambda: new_reader(ints),
+            FIELDS,
+        ),
+        Case(
+            "reader.consume_int_or_none",
+            consume_all(Reader.consume_int_or_none),
+            lambda: new_reader(optional_ints),
+            FIELDS,
+        ),
+        Case(
+            "reader.consume_bool",
+            consume_all(Reader.consume_bool),
+            lambda: new_reader(bools),
+            FIELDS,
+        ),
+        Case("party.read_from", models.Party.read_from, party_reader),
+        Case(
+            "party.read_from[fields]",
+            models.Party.read_from,
+            party_reader,
+            context=reference_parsers,
+        ),
+        Case(
+            "party.read_from[no validate]",
+            models.Party.read_from,
+            party_reader,
+            context=no_validation,
+        ),
+        Case(
+            "check_find",
+            lambda raw: check_find(raw, version),
+            lambda: fixtures.VALID,
+        ),
+        Case(
+            "writer.escape",
+            lambda raw: [Writer.escape(f) for f in raw],
+            lambda: party_raw,
+            len(party_raw),
+        ),
+        Case("writer.encode_fields", Writer.encode_fields, lambda: party_raw),
+        Case("writer.encode[found]", encode_found, lambda: party_encoded),
+    ]
+
+    for amount in RULES:
+        directory = workdir / f"rules{amount}"
+        files_hash = write_rules(directory, amount)
+        all_cases.append(
+            Case(
+                f"watcher.load_rules[{amount} files]",
+                functools.partial(load_rules, directory),
+                functools.partial(dict, files_hash),
+            ),
+        )
+
+    for extra in PADDING:
+        directory = workdir / f"pbs{extra}"
+        pad_pbs(pbs_dir, directory, extra)
+        config = bench_utils.server_config(PBS_DIR=directory)
+        all_cases.append(
+            Case(
+                f"models.configure[+{extra} sections]",
+                models.configure,
+                functools.partial(identity, config),
+            ),
+        )
+
+    return all_cases
+
+
+def commit() -> str | None:
+    """Get the current commit, if running from a git checkout."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def run(args: argparse.Namespace) -> dict[str, object]:
+    """Time every case whose name matches the filter."""
+    results: dict[str, dict[str, float]] = {}
+
+    with tempfile.TemporaryDirectory() as tmp, utils.disable_warnings():
+        # configured like the server, before timing anything that reads parties
+        models.configure(bench_utils.server_config(PBS_DIR=args.pbs_dir))
+
+        for case in cases(args.pbs_dir, Path(tmp)):
+            if args.filter and args.filter not in case.name:
+                continue
+
+            # reconfigure after timing models.configure
+            models.configure(bench_utils.server_config(PBS_DIR=args.pbs_dir))
+
+            gc.collect()
+            gc.disable()
+            try:
+                results[case.name] = case.measure(args.repeat, args.min_time)
+            finally:
+                gc.enable()
+
+    return {
+        "commit": commit(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "results": results,
+    }
+
+
+def report(results: dict[str, dict[str, float]], baseline: dict[str, object]) -> None:
+    """Print the results, against the baseline's if any."""
+    previous = baseline.get("results", {})
+    if not isinstance(previous, dict):
+        previous = {}
+
+    print(f"{'case':<36} {'min':>12} {'median':>12} {'change':>8}")  # noqa: T201
+    for name, result in results.items():
+        change = ""
+        if name in previous:
+            ratio = result["min_ns"] / previous[name]["min_ns"]
+            change = f"{ratio - 1:+.1%}"
+
+        print(  # noqa: T201
+            f"{name:<36} {result['min_ns']:>10.0f}ns {result['median_ns']:>10.0f}ns"
+            f" {change:>8}",
+        )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Read the options from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pbs-dir", type=Path, default=Path("PBS"))
+    parser.add_argument("--filter", help="only run cases containing this text")
+    parser.add_argument("--repeat", type=int, default=7, help="samples per case")
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.1,
+        help="seconds that each sample lasts, at least",
+    )
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON of a previous run")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Entrypoint of the microbenchmarks."""
+    args = parse_args(argv)
+    output = run(args)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(output, indent=2) + "\n")
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else {}
+    results = output["results"]
+    if isinstance(results, dict):
+        report(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Utilities to run a server, and talk to it, on benchmarks."""
+
+import socket
+from typing import cast
+
+from bench import fixtures
+from cable_club import config
+
+
+def server_config(**kwargs: object) -> config.DictConfig:
+    """Config to run a server on a random port, without warnings about defaults."""
+    values: dict[str, object] = {}
+    for name in config.Config._fields:  # noqa: SLF001
+        setting = getattr(config.Config, name)
+        values[setting.key] = setting.default
+
+    values.update(
+        HOST="127.0.0.1",
+        PORT=0,
+        ESSENTIALS_DELUXE_INSTALLED=True,
+        ZUD_DYNAMAX_INSTALLED=True,
+        TERA_INSTALLED=True,
+        # every client connects from localhost
+        CONNECTION_RATE=0.0,
+    )
+    values.update(kwargs)
+    return config.DictConfig(**values)
+
+
+def free_port() -> int:
+    """Find a port that is not being used."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return cast(int, sock.getsockname()[1])
+
+
+def find_message(*, peer_id: int, id_: int) -> bytes:
+    """Tweak the fixture's ids, so that it can be matched with another trainer."""
+    fields = fixtures.VALID.split(b",")
+    fields[2] = str(peer_id).encode()
+    fields[4] = str(id_).encode()
+    return b",".join(fields) + b"\n"
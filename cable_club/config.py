@@ -12,7 +12,7 @@ from abc import ABC, abstractmethod
 from pathlib import Path
 from typing import TYPE_CHECKING, Generic, TypeVar, cast, final, overload
 
-from . import exceptions
+from . import exceptions, utils
 from .version import Version
 
 if TYPE_CHECKING:
@@ -29,11 +29,6 @@ class Setting(Generic[T]):
     :meta private:
     """
 
-    # TODO(elpekenin): change logic, similar to models, to store on instance
-    # instead of self? could cause some weird behavior with current code if there are
-    # 2 instances of Config at the same time (shouldnt happen, tho)
-
-    _value: T | None
     _name: str
 
     @overload
@@ -47,7 +42,9 @@ class Setting(Generic[T]):
         if instance is None:
             return self
 
-        if self._value is None:
+        # store on the instance, so that several configs can coexist (eg: tests)
+        values: dict[str, object] = instance.__dict__.setdefault("_values", {})
+        if self._name not in values:
             raw = instance.get(self.key)
             if raw is not Config.Sentinel:
                 # mypy doesnt understand that `is not` cancels out the possibility of
@@ -59,9 +56,9 @@ class Setting(Generic[T]):
                 msg = f"Could not read setting '{self.key}', using default ({repr_})."
                 warnings.warn(msg, stacklevel=2)
 
-            self._value = value
+            values[self._name] = value
 
-        return self._value
+        return cast(T, values[self._name])
 
     def __init__(
         self,
@@ -75,8 +72,6 @@ class Setting(Generic[T]):
         self.default = default
         self.convert = convert
 
-        self._value = None
-
     def do_convert(self, raw: str | T) -> T:
         """Convert a raw value into the expected type."""
         expected_type = type(self.default)
@@ -134,6 +129,142 @@ class Config(ABC):
     )
     """The port the server is listening on."""
 
+    server_backend = Setting(
+        key="SERVER_BACKEND",
+        default="sync",
+        convert=str,
+    )
+    """How the server handles sockets: "sync" (blocking loop) or "asyncio"."""
+
+    workers = Setting(
+        key="WORKERS",
+        default=1,
+        convert=int,
+    )
+    """Amount of processes sharing the port. Only for the "sync" backend."""
+
+    handoff_socket = Setting(
+        key="HANDOFF_SOCKET",
+        default="",
+        convert=str,
+    )
+    """Unix socket where a newly started server asks the running one for its players.
+
+    Allows restarting without cutting battles off. Empty = disabled. Only for the
+    "sync" backend with a single worker.
+    """
+
+    metrics_host = Setting(
+        key="METRICS_HOST",
+        default="127.0.0.1",
+        convert=str,
+    )
+    """Address where metrics are served."""
+
+    metrics_port = Setting(
+        key="METRICS_PORT",
+        default=0,
+        convert=int,
+    )
+    """Port where metrics are served, in Prometheus' format. 0 = disabled.
+
+    With several workers, each one serves its own on the following ports.
+    """
+
+    listen_backlog = Setting(
+        key="LISTEN_BACKLOG",
+        default=1024,
+        convert=int,
+    )
+    """Connections that the OS will queue, waiting to be accepted."""
+
+    accept_budget = Setting(
+        key="ACCEPT_BUDGET",
+        default=64,
+        convert=int,
+    )
+    """Maximum connections accepted on a single iteration. Only for "sync" backend."""
+
+    validation_workers = Setting(
+        key="VALIDATION_WORKERS",
+        default=0,
+        convert=int,
+    )
+    """Processes where parties are validated. 0 = on the server itself (blocking)."""
+
+    connecting_timeout = Setting(
+        key="CONNECTING_TIMEOUT",
+        default=30.0,
+        convert=float,
+    )
+    """Seconds that a client has to send its party, before getting kicked. 0 = never."""
+
+    finding_timeout = Setting(
+        key="FINDING_TIMEOUT",
+        default=600.0,
+        convert=float,
+    )
+    """Seconds that a client can wait for its peer, before getting kicked. 0 = never."""
+
+    idle_timeout = Setting(
+        key="IDLE_TIMEOUT",
+        default=600.0,
+        convert=float,
+    )
+    """Seconds that a connected client can go quiet before getting kicked. 0 = never."""
+
+    connection_rate = Setting(
+        key="CONNECTION_RATE",
+        default=1.0,
+        convert=float,
+    )
+    """New connections per second allowed from a single IP, on average. 0 = no limit."""
+
+    connection_burst = Setting(
+        key="CONNECTION_BURST",
+        default=10,
+        convert=int,
+    )
+    """New connections allowed at once from a single IP, before rate limiting."""
+
+    max_connections_per_ip = Setting(
+        key="MAX_CONNECTIONS_PER_IP",
+        default=32,
+        convert=int,
+    )
+    """Live connections allowed from a single IP. 0 = no limit."""
+
+    max_message_size = Setting(
+        key="MAX_MESSAGE_SIZE",
+        default=1 << 16,
+        convert=int,
+    )
+    """Maximum length of a message, in bytes. Clients sending bigger ones get kicked."""
+
+    high_watermark = Setting(
+        key="HIGH_WATERMARK",
+        default=1 << 18,
+        convert=int,
+    )
+    """Bytes queued for a client after which we stop reading from its peer."""
+
+    low_watermark = Setting(
+        key="LOW_WATERMARK",
+        default=1 << 16,
+        convert=int,
+    )
+    """Bytes queued for a client below which we resume reading from its peer."""
+
+    raw_relay = Setting(
+        key="RAW_RELAY",
+        default=False,
+        convert=bool,
+    )
+    """Forward bytes between connected players as-is, rather than line by line.
+
+    On Linux, the "sync" backend moves them with :py:func:`os.splice`.
+    """
+
     pbs_dir = Setting(
         key="PBS_DIR",
         default=Path("PBS"),
@@ -162,6 +293,16 @@ class Config(ABC):
     )
     """The log level of the server. Messages lower than the level are not written."""
 
+    log_rate = Setting(
+        key="LOG_RATE",
+        default=20.0,
+        convert=float,
+    )
+    """Debug messages per second logged from each line of code, the rest are dropped.
+
+    Some are logged for every message/send. 0 = no limit.
+    """
+
     rules_refresh_rate = Setting(
         key="RULES_REFRESH_RATE",
         default=60,
@@ -288,10 +429,36 @@ class Config(ABC):
     )
     """Port on which debugpy (remote debugger) will be listening."""
 
+    profiler = Setting(
+        key="PROFILER",
+        default="sampling",
+        convert=str,
+    )
+    """Profiler started by SIGUSR1: "sampling" (low overhead) or "cprofile"."""
+
+    profile_duration = Setting(
+        key="PROFILE_DURATION",
+        default=30.0,
+        convert=float,
+    )
+    """Seconds that the profiler runs for, before dumping its results to log_dir."""
+
     @abstractmethod
     def get(self, key: str) -> str | T | type[Config.Sentinel]:
         """Backend-specific way to grab a configuration or mark it was not found."""
 
+    @final
+    def __getstate__(self) -> dict[str, object]:
+        """Pickle the values (eg: to configure other processes), not their source."""
+        with utils.disable_warnings():
+            values = {name: getattr(self, name) for name in self._fields}
+        return {"_values": values}
+
+    @final
+    def __setstate__(self, state: dict[str, object]) -> None:
+        """Restore a pickled config, get() will not be called on it."""
+        self.__dict__.update(state)
+
     @final
     def __str__(self) -> str:
         """Show the config."""
@@ -333,6 +500,22 @@ class PyFileConfig(Config):
         return getattr(self._file, key, self.Sentinel)
 
 
+@final
+class DictConfig(Config):
+    """Read values given as keyword arguments (eg: when embedding the server)."""
+
+    def __init__(self, **settings: object) -> None:
+        """Initialize an instance."""
+        self._settings = settings
+
+    def get(self, key: str) -> str | T | type[Config.Sentinel]:
+        """Grab a key from the given values."""
+        return cast(
+            str | T | type[Config.Sentinel],
+            self._settings.get(key, self.Sentinel),
+        )
+
+
 @final
 class EnvironmentConfig(Config):
     """Read environment variables."""
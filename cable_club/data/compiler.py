@@ -0,0 +1,252 @@
+"""Generate a parser for each model, specialized for the active configuration.
+
+Parsers are built from the source of each model's ``do_read_from`` (which is kept
+as the reference implementation), rewriting its AST:
+
+* ``if self.config.<...>:`` blocks are resolved, only the enabled code is kept.
+* ``self.<field> = value`` validates the value inline (ranges, options, length)
+  and stores it right away, rather than going through the descriptor.
+* ``Model.read_from(reader)`` calls the generated parser of that model directly.
+
+Checks only call the field's ``validate`` when the value is wrong, so that errors
+are the same ones raised by the reference.
+"""
+
+from __future__ import annotations
+
+import ast
+import functools
+import inspect
+import logging
+import sys
+import textwrap
+from typing import TYPE_CHECKING
+
+from . import fields
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from .models import Model
+    from .reader import Reader
+
+    Parser = Callable[[Reader], Model]
+
+_logger = logging.getLogger(__name__)
+
+VALUE = "_value"
+"""Name of the variable holding the value being assigned."""
+
+
+def parser_name(model: type[Model]) -> str:
+    """Name of the function generated for a model."""
+    return f"_parse_{model.__name__}"
+
+
+def field_name(model: type[Model], name: str) -> str:
+    """Name of the variable holding a field's descriptor."""
+    return f"_field_{model.__name__}_{name}"
+
+
+def model_fields(model: type[Model]) -> dict[str, fields.Base[object]]:
+    """Fields of a model, by name."""
+    return {
+        name: value
+        for cls in reversed(model.__mro__)
+        for name, value in vars(cls).items()
+        if isinstance(value, fields.Base)
+    }
+
+
+def check(model: type[Model], name: str, field: fields.Base[object]) -> str:
+    """Source of the inline validation of a field, empty if there is none."""
+    conditions = []
+    if isinstance(field, fields.Int):
+        if field.min_val is not None:
+            conditions.append(f"{VALUE} < {field.min_val}")
+        if field.max_val is not None:
+            conditions.append(f"{VALUE} > {field.max_val}")
+    elif isinstance(field, fields.OneOf):
+        conditions.append(f"{VALUE} not in {field_name(model, name)}.options")
+    elif isinstance(field, fields.Str) and field.max_len is not None:
+        conditions.append(f"len({VALUE}) > {field.max_len}")
+
+    if not conditions:
+        return ""
+
+    condition = " or ".join(conditions)
+    if isinstance(field, fields.OptionalInt):
+        condition = f"{VALUE} is not None and ({condition})"
+    return f"if {condition}: {field_name(model, name)}.validate({VALUE})"
+
+
+class Rewriter(ast.NodeTransformer):
+    """Specialize the body of a model's ``do_read_from``."""
+
+    def __init__(self, model: type[Model], models: set[str]) -> None:
+        """Initialize an instance, ``models`` are the names with a parser."""
+        self.model = model
+        self.models = models
+        self.fields = model_fields(model)
+
+    def is_self(self, node: ast.AST, attr: str | None = None) -> bool:
+        """Whether a node is ``self.<something>`` (``self.<attr>``, if given)."""
+        return (
+            isinstance(node, ast.Attribute)
+            and isinstance(node.value, ast.Name)
+            and node.value.id == "self"
+            and (attr is None or node.attr == attr)
+        )
+
+    def is_config(self, test: ast.expr) -> bool:
+        """Whether an expression only depends on the configuration."""
+        names = [node for node in ast.walk(test) if isinstance(node, ast.Name)]
+        configs = [node for node in ast.walk(test) if self.is_self(node, "config")]
+        return bool(names) and len(names) == len(configs)
+
+    def visit_If(self, node: ast.If) -> ast.AST | list[ast.stmt]:
+        """Keep only the enabled branch of ``if self.config...`` blocks."""
+        if not self.is_config(node.test):
+            return self.generic_visit(node)
+
+        code = compile(ast.Expression(node.test), "<config>", "eval")
+        # configuration is a class attribute
+        enabled = eval(code, {}, {"self": self.model})  # noqa: S307
+        branch = node.body if enabled else node.orelse
+        stmts = flatten([self.visit(stmt) for stmt in branch])
+        return stmts or [ast.Pass()]
+
+    def visit_Assign(self, node: ast.Assign) -> ast.AST | list[ast.stmt]:
+        """Validate and store the value of a field."""
+        target = node.targets[0]
+        if not (
+            len(node.targets) == 1
+            and self.is_self(target)
+            and target.attr in self.fields  # type: ignore[attr-defined]
+        ):
+            return self.generic_visit(node)
+
+        name = target.attr  # type: ignore[attr-defined]
+        value = self.visit(node.value)
+        stmts: list[ast.stmt] = [
+            ast.Assign(targets=[ast.Name(VALUE, ast.Store())], value=value),
+        ]
+        source = check(self.model, name, self.fields[name])
+        if source:
+            stmts.extend(ast.parse(source).body)
+        stmts.extend(ast.parse(f"values.{name} = {VALUE}").body)
+        return stmts
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        """Access fields on the storage, rather than through the descriptor."""
+        if self.is_self(node) and node.attr in self.fields:
+            return ast.Attribute(ast.Name("values", ast.Load()), node.attr, node.ctx)
+        return self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        """Call generated parsers directly, rather than through ``read_from``."""
+        func = node.func
+        if (
+            isinstance(func, ast.Attribute)
+            and func.attr == "read_from"
+            and isinstance(func.value, ast.Name)
+            and func.value.id in self.models
+        ):
+            name = f"_parse_{func.value.id}"
+            node.func = ast.Name(name, ast.Load())
+        return self.generic_visit(node)
+
+
+@functools.cache
+def read_source(model: type[Model]) -> str:
+    """Source of a model's ``do_read_from``, it does not change between configs."""
+    return textwrap.dedent(inspect.getsource(model.do_read_from))
+
+
+def generate(model: type[Model], models: set[str]) -> ast.Module:
+    """AST of the parser for a model."""
+    function = ast.parse(read_source(model)).body[0]
+    if not isinstance(function, ast.FunctionDef):
+        msg = f"Unexpected source for {model.__name__}.do_read_from"
+        raise TypeError(msg)
+
+    reader = function.args.args[1].arg
+    body = function.body
+    if ast.get_docstring(function) is not None:
+        body = body[1:]
+    stmts = flatten(map(Rewriter(model, models).visit, body))
+    # disabled blocks leave a pass behind, not needed at this level
+    stmts = [stmt for stmt in stmts if not isinstance(stmt, ast.Pass)]
+
+    prologue = ast.parse(
+        f"self = _new({model.__name__})\nvalues = self.values\n",
+    ).body
+    epilogue = ast.parse("return self").body
+    # no need to call the default one, a noop
+    if "validate" in vars(model):
+        epilogue = ast.parse("self.validate()\nreturn self").body
+
+    parser = ast.FunctionDef(
+        name=parser_name(model),
+        args=ast.arguments(
+            posonlyargs=[],
+            args=[ast.arg(reader)],
+            kwonlyargs=[],
+            kw_defaults=[],
+            defaults=[],
+        ),
+        body=[*prologue, *stmts, *epilogue],
+        decorator_list=[],
+        lineno=1,
+    )
+    return ast.fix_missing_locations(ast.Module([parser], []))
+
+
+def flatten(stmts: Iterable[ast.AST | list[ast.stmt]]) -> list[ast.stmt]:
+    """Splice the lists of statements returned by the rewriter."""
+    flat: list[ast.stmt] = []
+    for stmt in stmts:
+        if isinstance(stmt, list):
+            flat.extend(stmt)
+        elif isinstance(stmt, ast.stmt):
+            flat.append(stmt)
+    return flat
+
+
+def new(model: type[Model]) -> Model:
+    """Create an empty instance, without going through ``__setattr__``."""
+    self = model.__new__(model)
+    object.__setattr__(self, "values", fields.ValueStorage())
+    return self
+
+
+def compile_parsers(models: list[type[Model]]) -> dict[type[Model], Parser]:
+    """Generate a parser for each model, those that fail are left out.
+
+    Models must be configured already, checks are built from their fields.
+    """
+    names = {model.__name__ for model in models}
+    namespace: dict[str, object] = {}
+    for model in models:
+        namespace.update(vars(sys.modules[model.__module__]))
+        # fallback, in case its parser can not be generated
+        namespace[parser_name(model)] = model.read_from
+
+    namespace["_new"] = new
+
+    parsers: dict[type[Model], Parser] = {}
+    for model in models:
+        for name, field in model_fields(model).items():
+            namespace[field_name(model, name)] = field
+
+        try:
+            tree = generate(model, names)
+            code = compile(tree, f"<{parser_name(model)}>", "exec")
+        except (OSError, SyntaxError, TypeError) as e:
+            _logger.warning("Could not generate parser for %s: %s", model, e)
+            continue
+
+        exec(code, namespace)  # noqa: S102
+        parsers[model] = namespace[parser_name(model)]  # type: ignore[assignment]
+
+    return parsers
@@ -9,13 +9,14 @@ from typing import TYPE_CHECKING, final
 from cable_club import constants, exceptions
 from cable_club.constants import ABILITIES_FILE, ITEMS_FILE, MOVES_FILE, POKEMONS_FILE
 
-from . import configparser, fields
+from . import compiler, configparser, fields
 
 if TYPE_CHECKING:
     from typing_extensions import Self
 
     from cable_club.config import Config
 
+    from .compiler import Parser
     from .reader import Reader
 
 
@@ -90,13 +91,34 @@ class Model(ABC):
     @final
     @classmethod
     def read_from(cls, reader: Reader) -> Self:
-        """Create an instance by reading values."""
+        """Create an instance by reading values.
+
+        Uses the parser generated for the current configuration, if any.
+        """
+        parser = parsers.get(cls)
+        if parser is not None:
+            return parser(reader)  # type: ignore[return-value]
+
+        return cls.read_from_fields(reader)
+
+    @final
+    @classmethod
+    def read_from_fields(cls, reader: Reader) -> Self:
+        """Create an instance by reading values, validated by each field.
+
+        Reference implementation for the generated parsers, see
+        :py:mod:`cable_club.data.compiler`.
+        """
         self = cls()
         self.do_read_from(reader)
         self.validate()
         return self
 
 
+parsers: dict[type[Model], Parser] = {}
+"""Generated for the current configuration, by :py:func:`configure`."""
+
+
 class Move(Model):
     """Represent a Pokemon's move."""
 
@@ -461,11 +483,27 @@ class Party(Model):
 
     def do_read_from(self, reader: Reader) -> None:
         """Initialize an instance by reading input."""
+        self.read_start(reader)
+        while not self.complete():
+            self.read_pokemon(reader)
+        self.read_end(reader)
+
+    # split in steps, to parse a party as it comes in (see network.states.FindParser)
+    def read_start(self, reader: Reader) -> None:
+        """Read the amount of Pokemon."""
         self.pokemons = []
         self.n_pokemon = reader.consume_int()
-        for _ in range(self.n_pokemon):
-            self.pokemons.append(Pokemon.read_from(reader))
 
+    def complete(self) -> bool:
+        """Whether every Pokemon was read already."""
+        return len(self.pokemons) == self.n_pokemon
+
+    def read_pokemon(self, reader: Reader) -> None:
+        """Read the next Pokemon."""
+        self.pokemons.append(Pokemon.read_from(reader))
+
+    def read_end(self, reader: Reader) -> None:
+        """Check that there is nothing after the Pokemon."""
         leftovers = reader.raw_all()
         if leftovers:
             rest = ", ".join(leftovers)
@@ -474,7 +512,8 @@ class Party(Model):
 
 
 def configure(config: Config) -> None:
-    """Apply configuration on fields that depend on it."""
+    """Apply configuration on fields that depend on it, and generate the parsers."""
+    parsers.clear()
     Model.config = config
 
     # max int values
@@ -496,3 +535,6 @@ def configure(config: Config) -> None:
     Pokemon.item.options = Pokemon.pokeball.options = configparser.sections(
         config.pbs_dir / ITEMS_FILE,
     )
+
+    # last, checks are built from the values set above
+    parsers.update(compiler.compile_parsers(Model.__subclasses__()))
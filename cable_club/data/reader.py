@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import re
 from typing import TYPE_CHECKING, TypeVar
 
 from cable_club import exceptions
@@ -12,17 +13,37 @@ if TYPE_CHECKING:
 
 T = TypeVar("T")
 
+SEPARATOR = ","
+ESCAPE = "\\"
+
+_ESCAPED = re.compile(r"\\(.)", re.DOTALL)
+"""An escape, capturing the character it applies to."""
+
 
 class Reader:
     """Parse incoming data."""
 
     fields: list[str]
+    cursor: int
+    """Index of the next field to be consumed."""
 
     @classmethod
     def new(cls, raw: bytes) -> Self | None:
         """Try an initialize a reader."""
         self = cls()
 
+        fields = self._split(raw)
+        if fields is None:
+            return None
+
+        self.fields = fields
+        self.cursor = 0
+
+        return self
+
+    @staticmethod
+    def _split(raw: bytes) -> list[str] | None:
+        """Decode and split some data into fields, None if it is not valid UTF8."""
         try:
             line = raw.decode(UTF8)
         except UnicodeDecodeError:
@@ -30,30 +51,46 @@ class Reader:
             # prevent raising and cluttering logs
             return None
 
-        self.fields = []
-        field = ""
-        escape = False
-        for c in line:
-            if c == "," and not escape:
-                self.fields.append(field)
-                field = ""
-            elif c == "\\" and not escape:
-                escape = True
-            else:
-                field += c
-                escape = False
-        self.fields.append(field)
-        self.fields.reverse()
+        if ESCAPE in line:
+            return Reader._split_escaped(line)
+        return line.split(SEPARATOR)
 
-        return self
+    @staticmethod
+    def _split_escaped(line: str) -> list[str]:
+        """Split on the separators not preceded by an escape.
+
+        Escapes are removed, a trailing one (escaping nothing) is dropped.
+        """
+        fields = []
+        current = ""  # field being built across escapes
+        start = 0
+        for match in _ESCAPED.finditer(line):
+            first, *rest = line[start : match.start()].split(SEPARATOR)
+            current += first
+            if rest:
+                fields.append(current)
+                fields.extend(rest[:-1])
+                current = rest[-1]
+            current += match.group(1)
+            start = match.end()
+
+        # nothing left to match, other than a dangling escape
+        first, *rest = line[start:].removesuffix(ESCAPE).split(SEPARATOR)
+        current += first
+        fields.append(current)
+        fields.extend(rest)
+        return fields
 
     def consume(self) -> str:
         """Get a raw item from the reader."""
         try:
-            return self.fields.pop()
-        except IndexError:  # pop from empty list
+            field = self.fields[self.cursor]
+        except IndexError:
             raise exceptions.ExhaustedReaderError from None
 
+        self.cursor += 1
+        return field
+
     @staticmethod
     def _bool(raw: str) -> bool:
         """Convert to bool."""
@@ -89,5 +126,58 @@ class Reader:
         return self._int(raw)
 
     def raw_all(self) -> list[str]:
-        """Return raw data."""
-        return list(reversed(self.fields))
+        """Return raw data, without consuming it."""
+        return self.fields[self.cursor :]
+
+
+class StreamReader(Reader):
+    """Reader whose data comes in chunks, fields are available once complete.
+
+    The rest of the data (an incomplete field) is kept until the next chunk.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an instance, without any data."""
+        self.fields = []
+        self.cursor = 0
+        self.pending = bytearray()
+        """Data after the last separator."""
+        self.done = False
+        """Whether the last chunk was fed, no more fields will come."""
+
+    def feed(self, data: bytes, *, last: bool = False) -> bool:
+        """Add a chunk of data, return whether it was valid.
+
+        ``last`` is the chunk that finishes the line.
+        """
+        self.pending += data
+
+        end = len(self.pending) if last else self._last_separator()
+        if end == -1:
+            return True
+
+        # separators are ASCII, can not split a character in half
+        fields = self._split(bytes(self.pending[:end]))
+        if fields is None:
+            return False
+
+        self.fields.extend(fields)
+        del self.pending[: end + 1]
+        self.done = last
+        return True
+
+    def _last_separator(self) -> int:
+        """Position of the last separator that is not escaped, -1 if none."""
+        pending = self.pending
+        end = pending.rfind(SEPARATOR.encode())
+        while end != -1:
+            # pending starts after a separator, so escapes come in pairs unless the
+            # last one applies to this separator
+            start = end
+            while start and pending[start - 1] == ord(ESCAPE):
+                start -= 1
+            if (end - start) % 2 == 0:
+                return end
+
+            end = pending.rfind(SEPARATOR.encode(), 0, start)
+        return -1
@@ -18,18 +18,37 @@ class Writer:
     def __init__(self) -> None:
         """Initialize an instance."""
         self.fields: list[str] = []
+        self.segments: list[bytes] = []
+        """Fields already encoded, they go before :py:attr:`fields`."""
+
+    def encode(self) -> bytes:
+        """Convert the fields into a line, ready to be sent."""
+        self.flush()
+        return b",".join(self.segments) + b"\n"
+
+    def flush(self) -> None:
+        """Encode the pending fields into a segment."""
+        if self.fields:
+            self.segments.append(Writer.encode_fields(self.fields))
+            self.fields = []
 
     def send_now(self, socket: socket) -> int:
         """Send variable over the wire."""
-        line = ",".join(Writer.escape(f) for f in self.fields)
-        line += "\n"
-        return socket.send(line.encode(UTF8))
+        return socket.send(self.encode())
 
     def send(self, client: Client) -> None:
         """Get data into buffer to be later sent."""
-        line = ",".join(Writer.escape(f) for f in self.fields)
-        line += "\n"
-        client.send_buffer += line.encode(UTF8)
+        client.queue(self.encode())
+
+    @staticmethod
+    def encode_fields(fields: list[str]) -> bytes:
+        """Escape and encode some fields, to be added by :py:meth:`splice`."""
+        joined = ",".join(fields)
+        # fast path: nothing to be escaped
+        if "\\" not in joined and joined.count(",") == len(fields) - 1:
+            return joined.encode(UTF8)
+
+        return ",".join(Writer.escape(f) for f in fields).encode(UTF8)
 
     @staticmethod
     def escape(raw: str) -> str:
@@ -43,3 +62,8 @@ class Writer:
     def add_raw(self, fs: list[str]) -> None:
         """Add raw fields to the writer."""
         self.fields.extend(fs)
+
+    def splice(self, segment: bytes) -> None:
+        """Add fields encoded by :py:meth:`encode_fields`, as they are."""
+        self.flush()
+        self.segments.append(segment)
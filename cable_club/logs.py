@@ -0,0 +1,115 @@
+"""Keep logging from blocking the server's loop.
+
+Records are put in a queue, the file is written from a background thread. Debug
+messages logged for every message/send are limited to a rate per call site, so
+that turning them on while something is going on does not flood the disk.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import TYPE_CHECKING
+
+from . import constants
+from .network.admission import TokenBucket
+
+if TYPE_CHECKING:
+    from .config import Config
+
+
+_listener: QueueListener | None = None
+
+
+class RateLimit(logging.Filter):
+    """Drop debug records logged too often from the same place.
+
+    Records with the same format string come from the same call site. Once it logs
+    again after dropping some, the amount is appended to its message.
+    """
+
+    def __init__(self, rate: float) -> None:
+        """Initialize an instance, ``rate`` is records per second per call site."""
+        super().__init__()
+        self.rate = rate
+        self.buckets: dict[object, TokenBucket] = {}
+        self.dropped: dict[object, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Whether the record gets logged."""
+        if record.levelno > logging.DEBUG:
+            return True
+
+        key = record.msg
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, max(1, int(self.rate)))
+
+        if not bucket.take(time.monotonic()):
+            self.dropped[key] = self.dropped.get(key, 0) + 1
+            return False
+
+        dropped = self.dropped.pop(key, 0)
+        if dropped:
+            record.msg = f"{record.msg} ({dropped} similar messages dropped)"
+        return True
+
+
+def setup(config: Config) -> None:
+    """Log into the configured file, from a background thread."""
+    global _listener  # noqa: PLW0603
+
+    file = logging.FileHandler(config.log_dir / constants.LOG_FILE)
+    file.setFormatter(logging.Formatter(constants.LOG_FORMAT))
+
+    handler = QueueHandler(queue.SimpleQueue())
+    if config.log_rate:
+        handler.addFilter(RateLimit(config.log_rate))
+
+    root = logging.getLogger()
+    root.setLevel(config.log_level)
+    root.addHandler(handler)
+
+    _listener = QueueListener(handler.queue, file)
+    _listener.start()
+
+    # the thread is not copied into forked processes (ie: cluster workers)
+    # only on Unix, elsewhere processes are not forked anyway
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_restart)
+
+
+def _restart() -> None:
+    """Start a new thread, with a new queue, on a forked process."""
+    global _listener  # noqa: PLW0603
+    if _listener is None:
+        return
+
+    new_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, QueueHandler):
+            handler.queue = new_queue
+
+    _listener = QueueListener(new_queue, *_listener.handlers)
+    _listener.start()
+
+
+def stop() -> None:
+    """Write the records left on the queue, and stop the thread."""
+    global _listener  # noqa: PLW0603
+    if _listener is None:
+        return
+
+    # anything logged from now on (eg: while exiting) is written right away
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+
+    _listener.stop()
+    _listener = None
@@ -13,13 +13,37 @@ import sys
 from typing import TYPE_CHECKING, NoReturn
 
 # TODO(elpekenin): specify class somehow? eg an argument via CLI + getattr(config, name)
-from . import constants
+from . import exceptions, logs
 from .config import Config, PyFileConfig
-from .network.server import Server
+from .network.aio import AsyncServer
+from .network.cluster import Coordinator
+from .network.upgrade import UpgradableServer
+from .profiler import Profiler
 
 if TYPE_CHECKING:
     from types import FrameType
 
+    from .network.server import BaseServer
+
+
+SERVERS: dict[str, type[BaseServer]] = {
+    "sync": UpgradableServer,
+    "asyncio": AsyncServer,
+}
+"""Available implementations, selected by :py:attr:`Config.server_backend`."""
+
+
+def get_server(config: Config) -> BaseServer:
+    """Instantiate the server backend selected on the config."""
+    try:
+        cls = SERVERS[config.server_backend]
+    except KeyError:
+        options = ", ".join(SERVERS)
+        msg = f"Unknown backend '{config.server_backend}' (use one of: {options})"
+        raise exceptions.BadConfigurationError(msg) from None
+
+    return cls(config)
+
 
 def setup_remote_debugger(config: Config) -> None:
     """Configure remote debugging."""
@@ -47,9 +71,20 @@ def setup_remote_debugger(config: Config) -> None:
     warnings.warn(msg, stacklevel=1)
 
 
+def setup_profiler(config: Config, server: BaseServer) -> None:
+    """Profile the server for a while, whenever SIGUSR1 is received."""
+    # not available on every platform (eg: Windows)
+    if not hasattr(signal, "SIGUSR1"):
+        return
+
+    profiler = Profiler(config, server.call_later)
+    server.add_signal_handler(signal.SIGUSR1, profiler.start)
+
+
 @atexit.register
 def cleanup() -> None:
     """Logic to be run before exiting in any way."""
+    logs.stop()
     logging.shutdown()
 
 
@@ -70,13 +105,16 @@ def main() -> NoReturn:
     exception = None
     try:
         config = PyFileConfig()
-        logging.basicConfig(
-            level=config.log_level,
-            filename=config.log_dir / constants.LOG_FILE,
-            format=constants.LOG_FORMAT,
-        )
+        logs.setup(config)
         setup_remote_debugger(config)
-        Server(config).run()
+        if config.workers > 1:
+            Coordinator(config).run()
+        else:
+            server = get_server(config)
+            setup_profiler(config, server)
+            server.run()
+        # eg: handed everything over to a newer process
+        sys.exit(0)
     # any unhandled error within the logic must be catched here to correctly shutdown
     except Exception as e:  # noqa: BLE001
         exception = e
@@ -0,0 +1,121 @@
+"""Decide which connections get in, before spending any time on them.
+
+Bots and HTTP scanners hit the port all the time. Their connections are dropped
+as early (and cheaply) as possible:
+
+* per-IP connection rate and concurrency limits, checked right after accepting
+* the first bytes of a connection must be ``find,``, checked before decoding
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from cable_club.config import Config
+
+
+PREFIX = b"find,"
+"""Every legit connection starts with this."""
+
+MAX_BUCKETS = 1 << 14
+"""Maximum amount of tracked IPs, the least recently seen ones get forgotten."""
+
+_logger = logging.getLogger(__name__)
+
+
+def has_valid_prefix(data: bytes | bytearray) -> bool:
+    """Whether the first bytes of a connection (can) match the expected ones."""
+    return PREFIX.startswith(data[: len(PREFIX)])
+
+
+class TokenBucket:
+    """Allow ``rate`` events per second, with bursts of up to ``burst`` events."""
+
+    __slots__ = ("burst", "rate", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """Initialize an instance, full."""
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Add the tokens earned since last update."""
+        elapsed = now - self.updated_at
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def take(self, now: float) -> bool:
+        """Try and consume a token."""
+        self.refill(now)
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
+
+    def full(self, now: float) -> bool:
+        """Whether the bucket is back to its initial state."""
+        self.refill(now)
+        return self.tokens >= self.burst
+
+
+class Admission:
+    """Per-IP limits on incoming connections."""
+
+    def __init__(self, config: Config) -> None:
+        """Initialize an instance."""
+        self.config = config
+        self.buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        """Rate limit of each IP, least recently seen first."""
+        self.connections: Counter[str] = Counter()
+        """Amount of live connections from each IP."""
+        self.rejected: Counter[str] = Counter()
+        """Amount of connections rejected, by reason."""
+
+    def admit(self, host: str) -> str | None:
+        """Check whether a new connection is allowed, return the reason if not."""
+        limit = self.config.max_connections_per_ip
+        if limit and self.connections[host] >= limit:
+            return self.reject(host, "too many connections")
+
+        rate = self.config.connection_rate
+        if rate:
+            now = time.monotonic()
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                # most likely full (ie: idle) again, anyway
+                if len(self.buckets) >= MAX_BUCKETS:
+                    self.buckets.popitem(last=False)
+                bucket = self.buckets[host] = TokenBucket(
+                    rate,
+                    self.config.connection_burst,
+                )
+            else:
+                self.buckets.move_to_end(host)
+
+            if not bucket.take(now):
+                return self.reject(host, "connecting too often")
+
+        return None
+
+    def reject(self, host: str, reason: str) -> str:
+        """Count a rejected connection."""
+        self.rejected[reason] += 1
+        _logger.debug("%s: rejected (%s)", host, reason)
+        return reason
+
+    def connected(self, host: str) -> None:
+        """Track a new connection."""
+        self.connections[host] += 1
+
+    def disconnected(self, host: str) -> None:
+        """Stop tracking a connection."""
+        self.connections[host] -= 1
+        if self.connections[host] <= 0:
+            del self.connections[host]
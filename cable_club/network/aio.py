@@ -0,0 +1,230 @@
+"""Handle clients' connections on top of asyncio."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, TypeVar, cast
+
+from cable_club.data.writer import Writer
+
+from . import metrics
+from .server import CLOSE_TIMEOUT, RECV_SIZE, BaseServer
+
+if TYPE_CHECKING:
+    import socket as s
+    from collections.abc import Callable
+    from concurrent.futures import Future
+
+    from cable_club.config import Config
+
+    from .client import Client
+
+T = TypeVar("T")
+
+_logger = logging.getLogger(__name__)
+
+
+class Protocol(asyncio.Protocol):
+    """Glue between asyncio's callbacks and the server's logic."""
+
+    socket: s.socket
+
+    def __init__(self, server: AsyncServer) -> None:
+        """Initialize an instance."""
+        self.server = server
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        """Start tracking the new client."""
+        transport = cast(asyncio.Transport, transport)
+        # NOTE: this is a `TransportSocket`, not a real socket, but we only use it
+        # as the key to identify the client
+        self.socket = transport.get_extra_info("socket")
+        address = transport.get_extra_info("peername")
+        if self.server.admission.admit(address[0]) is not None:
+            transport.abort()
+            return
+
+        transport.set_write_buffer_limits(
+            high=self.server.config.high_watermark,
+            low=self.server.config.low_watermark,
+        )
+        self.server.transports[self.socket] = transport
+        self.server.add_client(self.socket, address)
+
+    def data_received(self, data: bytes) -> None:
+        """Feed incoming data to the client's state."""
+        self.server.receive(self.socket, data)
+
+    def eof_received(self) -> bool | None:
+        """Zero-length read, the client is gone."""
+        self.server.disconnect(self.socket, "client disconnected")
+        return None
+
+    def pause_writing(self) -> None:
+        """Too much data queued for this client, stop reading from its peer."""
+        peer = self.server.peer_of(self.socket)
+        if peer is not None:
+            self.server.throttle(peer)
+
+    def resume_writing(self) -> None:
+        """Client caught up, resume reading from its peer."""
+        peer = self.server.peer_of(self.socket)
+        if peer is not None:
+            self.server.unthrottle(peer)
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        """Clean up after the connection got closed."""
+        reason = str(exc) if exc is not None else "client disconnected"
+        self.server.disconnect(self.socket, reason)
+
+
+class AsyncServer(BaseServer):
+    """Same logic as :py:class:`.server.Server`, driven by an asyncio event loop.
+
+    Can be embedded on an already running loop by awaiting :py:meth:`start` (or
+    :py:meth:`serve_forever`) instead of calling :py:meth:`run`.
+    """
+
+    def __init__(self, config: Config) -> None:
+        """Initialize an instance."""
+        super().__init__(config)
+        self.transports: dict[s.socket, asyncio.Transport] = {}
+        self.metrics_server: asyncio.Server | None = None
+        """Where metrics are served, if enabled."""
+        self.signal_handlers: dict[int, Callable[[], object]] = {}
+        """Installed on the loop once started, see :py:meth:`add_signal_handler`."""
+
+    async def start(self) -> asyncio.Server:
+        """Start listening for connections on the running loop."""
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(
+            lambda: Protocol(self),
+            self.config.host,
+            self.config.port,
+            reuse_address=True,
+            backlog=self.config.listen_backlog,
+        )
+        _logger.info("Started Server on %s:%d", self.config.host, self.config.port)
+
+        for signum, callback in self.signal_handlers.items():
+            loop.add_signal_handler(signum, callback)
+
+        self.schedule_rules_reload()
+
+        if self.config.metrics_port:
+            self.metrics_server = await asyncio.start_server(
+                self.scrape,
+                self.config.metrics_host,
+                self.config.metrics_port,
+            )
+
+        return server
+
+    async def scrape(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        """Answer a request for metrics, whatever it was."""
+        try:
+            await reader.read(RECV_SIZE)
+            writer.write(metrics.response(self))
+            await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self) -> None:
+        """Start listening for connections and keep serving until cancelled."""
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    def run(self) -> None:
+        """Execute the server's logic on a new event loop (blocking)."""
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            _logger.info("Stopping Server")
+        finally:
+            self.stop_pool()
+
+    def call_later(
+        self,
+        delay: float,
+        callback: Callable[[], object],
+    ) -> asyncio.TimerHandle:
+        """Schedule a callback to be run after some seconds."""
+        return asyncio.get_running_loop().call_later(delay, callback)
+
+    def when_done(
+        self,
+        future: Future[T],
+        callback: Callable[[Future[T]], object],
+    ) -> None:
+        """Run a callback on the loop, once a future from another thread completes."""
+        asyncio.wrap_future(future).add_done_callback(lambda _: callback(future))
+
+    def add_signal_handler(self, signum: int, callback: Callable[[], object]) -> None:
+        """Run a callback on the loop, whenever a signal is received.
+
+        The loop may not exist yet, handlers are installed by :py:meth:`start`.
+        """
+        self.signal_handlers[signum] = callback
+
+    def on_pending(self, socket: s.socket) -> None:
+        """Flush the buffer once current callback is done.
+
+        Waiting for the loop's next iteration coalesces all the messages queued
+        while handling the current one into a single write.
+        """
+        asyncio.get_running_loop().call_soon(self.flush, socket)
+
+    def flush(self, socket: s.socket) -> None:
+        """Hand a client's pending data to its transport."""
+        client = self.clients.get(socket)
+        if client is None or not client.send_buffer:
+            return
+
+        chunks = client.send_buffer.pop_all()
+        self.transports[socket].writelines(chunks)
+        n = sum(map(len, chunks))
+        _logger.debug("sent %d bytes to %s", n, socket)
+
+        self.send_calls += 1
+        self.sent_bytes += n
+
+    def check_backpressure(self, socket: s.socket, client: Client) -> None:
+        """Nothing to check, transports report it (see :py:class:`Protocol`).
+
+        Buffers are handed to the transport on the next iteration, checking their
+        size would throttle clients that only :py:meth:`Protocol.resume_writing`
+        can unthrottle, which is not called unless writing was paused.
+        """
+
+    def pause_reading(self, socket: s.socket) -> None:
+        """Stop receiving data from a client."""
+        self.transports[socket].pause_reading()
+
+    def resume_reading(self, socket: s.socket) -> None:
+        """Start receiving data from a client again."""
+        self.transports[socket].resume_reading()
+
+    def close(self, socket: s.socket, client: Client, reason: str) -> None:
+        """Let the client know why it is being disconnected, and close the transport.
+
+        The transport sends the pending data, without blocking, before closing. Up
+        to CLOSE_TIMEOUT, then it is aborted.
+        """
+        transport = self.transports.pop(socket)
+        transport.writelines(client.send_buffer.pop_all())
+
+        writer = Writer()
+        writer.add("disconnect")
+        writer.add(reason)
+        transport.write(writer.encode())
+        transport.close()
+        # does nothing if it got closed already
+        self.call_later(CLOSE_TIMEOUT, transport.abort)
@@ -2,21 +2,130 @@
 
 from __future__ import annotations
 
+import itertools
+import os
+import socket as s
+import time
+from collections import deque
+from typing import TYPE_CHECKING
+
+from cable_club import utils
+
 from .states import Connecting, State
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from socket import socket
+
+    from .timers import Cancellable
+
+IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 16
+"""Maximum amount of buffers that can be sent on a single call."""
+
+SENDMSG = hasattr(s.socket, "sendmsg")
+"""Whether scatter/gather I/O is available (eg: not on Windows)."""
+
+
+class SendQueue:
+    """Outgoing data, kept as a queue of chunks rather than a single (growing) bytes.
+
+    Chunks are sent at once with scatter/gather I/O, and partial sends only advance
+    an offset, instead of copying the remaining data.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an instance."""
+        self.chunks: deque[bytes] = deque()
+        self.offset = 0
+        """Amount of bytes from the first chunk that were already sent."""
+        self.size = 0
+        """Amount of bytes waiting to be sent."""
+
+    def __len__(self) -> int:
+        """Amount of bytes waiting to be sent."""
+        return self.size
+
+    def append(self, data: bytes) -> None:
+        """Add a chunk at the end of the queue."""
+        if not data:
+            return
+
+        self.chunks.append(data)
+        self.size += len(data)
+
+    def send(self, socket: socket) -> int:
+        """Send as much data as possible in a single call."""
+        first = memoryview(self.chunks[0])[self.offset :]
+        rest = itertools.islice(self.chunks, 1, IOV_MAX)
+        if SENDMSG:
+            n = socket.sendmsg([first, *rest])
+        else:
+            # a single copy, rather than a call per chunk
+            n = socket.send(b"".join([first, *rest]))
+        self.advance(n)
+        return n
+
+    def advance(self, n: int) -> None:
+        """Discard the first n bytes of the queue."""
+        self.size -= n
+        n += self.offset
+        while self.chunks and n >= len(self.chunks[0]):
+            n -= len(self.chunks.popleft())
+        self.offset = n
+
+    def pop_all(self) -> list[bytes]:
+        """Remove every chunk from the queue."""
+        chunks = list(self.chunks)
+        if chunks and self.offset:
+            chunks[0] = chunks[0][self.offset :]
+
+        self.chunks.clear()
+        self.offset = self.size = 0
+        return chunks
+
 
 class Client:
     """Represent a client."""
 
-    def __init__(self, address: tuple[int, int]) -> None:
-        """Initialize an instance."""
+    def __init__(
+        self,
+        address: tuple[str, int],
+        on_pending: Callable[[], None] = utils.noop,
+    ) -> None:
+        """Initialize an instance.
+
+        ``on_pending`` is called whenever the send buffer goes from empty to
+        non-empty, so that the server can start watching the socket for writes.
+        """
         self.address = address
         self.state: State = Connecting()
-        self.send_buffer = b""
-        self.recv_buffer = b""
+        self.send_buffer = SendQueue()
+        self.recv_buffer = bytearray()
+        self.scanned = 0
+        """Bytes at the start of the receive buffer known not to contain a newline."""
+        self.on_pending = on_pending
+
+        self.timer: Cancellable | None = None
+        """Kicks the client if it stays too long on its current state."""
+        self.last_seen = time.monotonic()
+        """Last time data was received from this client."""
+        self.finding_since = 0.0
+        """When this client started waiting for its peer."""
+
+        self.throttled_at: float | None = None
+        """When we stopped reading from this client, because its peer was behind."""
+        self.throttled_for = 0.0
+        """Total time that this client has been throttled, in seconds."""
 
     def __str__(self) -> str:
         """Represent the state as a string."""
         return (
             f"{self.address[0]}:{self.address[1]}/{type(self.state).__name__.lower()}"
         )
+
+    def queue(self, data: bytes) -> None:
+        """Add data to the send buffer, to be written later on."""
+        was_empty = not self.send_buffer
+        self.send_buffer.append(data)
+        if was_empty:
+            self.on_pending()
@@ -0,0 +1,370 @@
+"""Run several worker processes, sharing the same port.
+
+Each worker is a regular :py:class:`.server.Server` listening with SO_REUSEPORT, so
+the kernel spreads incoming connections among them. Matchmaking, however, needs a
+global view: the parent process acts as a coordinator which mirrors every worker's
+index of waiting trainers (over a Unix socket). Whenever two matching trainers end
+up on different workers, the newcomer's socket is passed (SCM_RIGHTS) to the worker
+where its peer is waiting. Thus, relaying always happens within a single process.
+
+Messages between workers and coordinator use the same format as the clients', on
+top of SOCK_SEQPACKET so that each message is received at once:
+
+* worker -> coordinator
+
+  * ``wait,<public id>,<peer id>``: a trainer started waiting
+  * ``gone,<public id>,<peer id>``: a trainer stopped waiting
+  * ``handoff,<worker>`` + payload + fd: deliver a socket to another worker
+
+* coordinator -> worker
+
+  * ``move,<public id>,<peer id>,<worker>``: send this trainer to another worker
+  * ``adopt`` + payload + fd: a socket coming from another worker
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import selectors
+import signal
+import socket as s
+import time
+from typing import TYPE_CHECKING, NoReturn, cast
+
+from cable_club import exceptions, logs
+from cable_club.data.reader import Reader
+from cable_club.data.writer import Writer
+
+from .server import Server
+from .states import Finding, public_id
+
+if TYPE_CHECKING:
+    from cable_club.config import Config
+
+
+MAX_PACKET = 1 << 18
+"""Size of the buffer used to receive messages between processes."""
+
+MIN_UPTIME = 5.0
+"""Seconds that a worker must have run for, to be respawned once it is lost.
+
+Otherwise, it would crash over and over (eg: port already in use).
+"""
+
+_logger = logging.getLogger(__name__)
+
+
+def send(
+    channel: s.socket,
+    *fields: object,
+    payload: bytes = b"",
+    fd: int = -1,
+) -> None:
+    """Send a message to the other end of a channel, optionally with a socket."""
+    writer = Writer()
+    for field in fields:
+        writer.add(field)
+    data = writer.encode() + payload
+
+    if fd == -1:
+        channel.send(data)
+    else:
+        s.send_fds(channel, [data], [fd])
+
+
+def recv(channel: s.socket) -> tuple[Reader | None, bytes, list[int]]:
+    """Receive a message from a channel, reader is None when channel got closed."""
+    data, fds, flags, _ = s.recv_fds(channel, MAX_PACKET, 1)
+    if not data:
+        return None, b"", fds
+
+    if flags & s.MSG_TRUNC:
+        msg = "Message between processes got truncated."
+        raise RuntimeError(msg)
+
+    header, _, payload = data.partition(b"\n")
+    reader = Reader.new(header)
+    if reader is None:
+        msg = "Malformed message between processes."
+        raise RuntimeError(msg)
+
+    return reader, payload, fds
+
+
+class Worker(Server):
+    """Server running on a child process, talking to the coordinator."""
+
+    reuse_port = True
+
+    def __init__(self, config: Config, index: int, channel: s.socket) -> None:
+        """Initialize an instance."""
+        super().__init__(config)
+        self.index = index
+        self.channel = channel
+        self.selector.register(self.channel, selectors.EVENT_READ)
+
+    def metrics_port(self) -> int:
+        """Port where this worker's metrics are served, they can not be shared."""
+        return self.config.metrics_port + self.index
+
+    def handle_events(self, socket: s.socket, events: int) -> None:
+        """Handle a socket that is ready, including the coordinator's channel."""
+        if socket is self.channel:
+            self.handle_coordinator()
+            return
+
+        super().handle_events(socket, events)
+
+    def handle_coordinator(self) -> None:
+        """Process a message sent by the coordinator."""
+        reader, payload, fds = recv(self.channel)
+        if reader is None:
+            msg = "Lost connection with coordinator."
+            raise RuntimeError(msg)
+
+        command = reader.consume()
+        if command == "move":
+            key = (reader.consume_int(), reader.consume_int())
+            self.handoff(key, reader.consume_int())
+        elif command == "adopt":
+            self.adopt(fds[0], payload)
+        else:
+            _logger.error("Unknown command from coordinator: %s", command)
+
+    def start_finding(self, socket: s.socket, state: Finding) -> None:
+        """Add a trainer to the matchmaking index, and tell the coordinator."""
+        super().start_finding(socket, state)
+        send(self.channel, "wait", public_id(state.id), state.peer_id)
+
+    def stop_finding(self, socket: s.socket, state: Finding) -> None:
+        """Remove a trainer from the matchmaking index, and tell the coordinator."""
+        waiting = self.finding.get((public_id(state.id), state.peer_id), [])
+        if socket not in waiting:
+            return
+
+        super().stop_finding(socket, state)
+        send(self.channel, "gone", public_id(state.id), state.peer_id)
+
+    def handoff(self, key: tuple[int, int], target: int) -> None:
+        """Send a waiting trainer to another worker, where its peer is waiting."""
+        waiting = self.finding.get(key)
+        if not waiting:
+            # got matched locally, or disconnected, in the meantime
+            return
+
+        socket = waiting[0]
+        client = self.clients.pop(socket)
+        state = cast(Finding, client.state)
+        self.stop_finding(socket, state)
+        if client.timer is not None:
+            client.timer.cancel()
+        self.admission.disconnected(client.address[0])
+        self.set_events(socket, 0)
+
+        # the other worker will handle it just like a newly connected client
+        payload = state.encode(self.config.game_version) + client.recv_buffer
+
+        send(self.channel, "handoff", target, payload=payload, fd=socket.fileno())
+        socket.close()
+        _logger.info("%s: moved to worker %d", client, target)
+
+    def adopt(self, fd: int, payload: bytes) -> None:
+        """Start handling a socket coming from another worker."""
+        socket = s.socket(fileno=fd)
+        # ruff doesnt like a boolean argument without any name
+        # but that's the function signature, nothing we can do here
+        socket.setblocking(False)  # noqa: FBT003
+        self.set_events(socket, selectors.EVENT_READ)
+        self.add_client(socket, socket.getpeername())
+        self.receive(socket, payload)
+
+
+class Coordinator:
+    """Spawn the workers and route trainers among them."""
+
+    def __init__(self, config: Config) -> None:
+        """Initialize an instance."""
+        if config.server_backend != "sync":
+            msg = "Multiple workers are only supported with the 'sync' backend"
+            raise exceptions.BadConfigurationError(msg)
+
+        self.config = config
+        self.selector = selectors.DefaultSelector()
+
+        self.pids: dict[int, int] = {}
+        """Process of each worker, by index."""
+        self.channels: dict[int, s.socket] = {}
+        """Connection to each worker, by index."""
+        self.started_at: dict[int, float] = {}
+        """When each worker was spawned, by index."""
+        self.exited: set[int] = set()
+        """Processes of lost workers, not reaped yet."""
+
+        self.finding: dict[tuple[int, int], list[int]] = {}
+        """Which worker(s) have trainers waiting, keyed by (public id, peer's id)."""
+
+    def spawn(self, index: int) -> None:
+        """Fork a new worker process."""
+        parent, child = s.socketpair(s.AF_UNIX, s.SOCK_SEQPACKET)
+
+        pid = os.fork()
+        if pid == 0:
+            parent.close()
+            for channel in self.channels.values():
+                channel.close()
+            self.work(index, child)
+
+        child.close()
+        self.pids[index] = pid
+        self.started_at[index] = time.monotonic()
+        self.add_channel(parent, index)
+
+    def add_channel(self, channel: s.socket, index: int | None = None) -> None:
+        """Start listening to a worker's messages, on a new index if not given."""
+        if index is None:
+            index = len(self.channels)
+        self.selector.register(channel, selectors.EVENT_READ, index)
+        self.channels[index] = channel
+
+    def work(self, index: int, channel: s.socket) -> NoReturn:
+        """Entrypoint of a worker process."""
+        code = 1
+        try:
+            Worker(self.config, index, channel).run()
+            code = 0
+        # killed by a signal, see main.signal_handler
+        except SystemExit:
+            code = 0
+        except Exception as e:
+            _logger.exception("Worker %d crashed", index, exc_info=e)
+        finally:
+            logs.stop()
+            logging.shutdown()
+            # do not return into the coordinator's logic (we are a copy of it)
+            os._exit(code)
+
+    def run(self) -> None:
+        """Spawn the workers and route messages among them (blocking)."""
+        for index in range(self.config.workers):
+            self.spawn(index)
+
+        _logger.info("Started %d workers", len(self.pids))
+        try:
+            while self.selector.get_map():
+                for key, _ in self.selector.select():
+                    self.handle(cast(int, key.data))
+                self.reap()
+        except KeyboardInterrupt:
+            _logger.info("Stopping Server")
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Stop all workers."""
+        for pid in self.pids.values():
+            # may have exited already
+            with contextlib.suppress(ProcessLookupError, ChildProcessError):
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+
+        # killed already, see lost()
+        for pid in self.exited:
+            with contextlib.suppress(ChildProcessError):
+                os.waitpid(pid, 0)
+        self.exited.clear()
+
+        self.selector.close()
+        for channel in self.channels.values():
+            channel.close()
+
+    def handle(self, index: int) -> None:
+        """Process a message sent by a worker."""
+        channel = self.channels[index]
+        reader, payload, fds = recv(channel)
+        if reader is None:
+            self.lost(index)
+            return
+
+        command = reader.consume()
+        if command == "wait":
+            self.wait(index, (reader.consume_int(), reader.consume_int()))
+        elif command == "gone":
+            self.gone(index, (reader.consume_int(), reader.consume_int()))
+        elif command == "handoff":
+            target = reader.consume_int()
+            try:
+                send(self.channels[target], "adopt", payload=payload, fd=fds[0])
+            # target may have been lost meanwhile
+            except (KeyError, OSError) as e:
+                msg = "Could not hand socket to worker %d"
+                _logger.exception(msg, target, exc_info=e)
+            finally:
+                os.close(fds[0])
+        else:
+            _logger.error("Unknown command from worker %d: %s", index, command)
+
+    def lost(self, index: int) -> None:
+        """Forget about a worker whose channel got closed, and start a new one."""
+        _logger.error("Lost connection with worker %d", index)
+        channel = self.channels.pop(index)
+        self.selector.unregister(channel)
+        channel.close()
+
+        self.finding = {
+            key: others
+            for key, waiting in self.finding.items()
+            if (others := [other for other in waiting if other != index])
+        }
+
+        pid = self.pids.pop(index, None)
+        # not a process of ours (eg: on tests)
+        if pid is None:
+            return
+
+        # it may be hung rather than gone, it must release its share of the port
+        with contextlib.suppress(ProcessLookupError):
+            os.kill(pid, signal.SIGKILL)
+        self.exited.add(pid)
+        self.reap()
+
+        if time.monotonic() - self.started_at.pop(index) < MIN_UPTIME:
+            _logger.error("Worker %d died right after starting, not respawning", index)
+            return
+
+        self.spawn(index)
+        _logger.info("Respawned worker %d", index)
+
+    def reap(self) -> None:
+        """Collect the exit status of lost workers, without blocking."""
+        for pid in list(self.exited):
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                # reaped already
+                done = pid
+
+            if done:
+                self.exited.discard(pid)
+
+    def wait(self, index: int, key: tuple[int, int]) -> None:
+        """Track a waiting trainer, and move it if the peer is on another worker."""
+        self.finding.setdefault(key, []).append(index)
+
+        public_id_, peer_id = key
+        for other in self.finding.get((peer_id, public_id_), []):
+            # trainers on the same worker are already matched by it
+            if other != index:
+                send(self.channels[index], "move", public_id_, peer_id, other)
+                return
+
+    def gone(self, index: int, key: tuple[int, int]) -> None:
+        """Stop tracking a trainer."""
+        waiting = self.finding.get(key)
+        if waiting is None or index not in waiting:
+            return
+
+        waiting.remove(index)
+        if not waiting:
+            del self.finding[key]
@@ -0,0 +1,222 @@
+"""Expose the server's internals in Prometheus' text format.
+
+Hot paths only bump some integers or drop a value into a histogram's bucket, the
+actual report is built when it gets requested.
+"""
+
+from __future__ import annotations
+
+import bisect
+import collections
+from typing import TYPE_CHECKING
+
+from cable_club.constants import UTF8
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from .server import BaseServer
+
+
+DURATION_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+"""Upper bounds of the buckets for things taking (hopefully) some milliseconds."""
+
+WAIT_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+"""Upper bounds of the buckets for people waiting, in seconds."""
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DISCONNECT_REASONS = {
+    "timed out": "timeout",
+    "client disconnected": "client disconnected",
+    "peer disconnected": "peer disconnected",
+    "not a cable_club message": "not a cable_club message",
+    "message too long": "message too long",
+    "invalid version": "invalid version",
+    "invalid party": "invalid party",
+    "invalid content": "invalid party",
+    "party's stream was incomplete.": "invalid party",
+}
+"""Label for each known reason to disconnect, see :py:func:`disconnect_reason`."""
+
+
+def disconnect_reason(reason: str) -> str:
+    """Map the reason to disconnect a client into one of a few labels.
+
+    Reasons can be arbitrary (eg: an OSError's text), using them as labels would
+    create an unbounded amount of series.
+    """
+    return DISCONNECT_REASONS.get(reason, "error")
+
+
+def escape(label: str) -> str:
+    """Escape a label's value."""
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Count observations on buckets, cumulated when rendered."""
+
+    def __init__(self, name: str, help_: str, buckets: tuple[float, ...]) -> None:
+        """Initialize an instance."""
+        self.name = name
+        self.help = help_
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        """Observations per bucket, last one being +Inf."""
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add a value."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self) -> list[str]:
+        """Represent in Prometheus' format."""
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram",
+        ]
+
+        total = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts, strict=True):
+            total += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {total}')
+
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {total}")
+        return lines
+
+
+class Metrics:
+    """Counters and histograms collected by a server."""
+
+    def __init__(self) -> None:
+        """Initialize an instance."""
+        self.connections = 0
+        """Amount of connections admitted."""
+        self.disconnects: collections.Counter[str] = collections.Counter()
+        """Amount of connections closed, by :py:func:`disconnect_reason`."""
+        self.received_bytes = 0
+        """Amount of bytes read from clients."""
+
+        self.party_check = Histogram(
+            "cable_club_party_check_seconds",
+            "Time spent parsing and validating parties.",
+            DURATION_BUCKETS,
+        )
+        self.matchmaking_wait = Histogram(
+            "cable_club_matchmaking_wait_seconds",
+            "Time that trainers spent waiting for their peer.",
+            WAIT_BUCKETS,
+        )
+        self.loop_iteration = Histogram(
+            "cable_club_loop_iteration_seconds",
+            "Time spent handling events on each iteration of the loop.",
+            DURATION_BUCKETS,
+        )
+
+
+def metric(
+    name: str,
+    type_: str,
+    help_: str,
+    values: Iterable[tuple[str, object]],
+) -> list[str]:
+    """Represent a metric, values are (labels, value) pairs."""
+    lines = [f"# HELP {name} {help_}", f"# TYPE {name} {type_}"]
+    lines.extend(f"{name}{labels} {value}" for labels, value in values)
+    return lines
+
+
+def labelled(label: str, counts: dict[str, int]) -> list[tuple[str, object]]:
+    """Convert a mapping into (labels, value) pairs."""
+    return [(f'{{{label}="{escape(key)}"}}', value) for key, value in counts.items()]
+
+
+def render(server: BaseServer) -> bytes:
+    """Build the report of a server's current status."""
+    metrics = server.metrics
+
+    states = collections.Counter(
+        {"connecting": 0, "validating": 0, "finding": 0, "connected": 0},
+    )
+    queued = 0
+    for client in server.clients.values():
+        states[type(client.state).__name__.lower()] += 1
+        queued += len(client.send_buffer)
+
+    lines = [
+        *metric(
+            "cable_club_clients",
+            "gauge",
+            "Clients connected, by state.",
+            labelled("state", states),
+        ),
+        *metric(
+            "cable_club_connections_total",
+            "counter",
+            "Connections admitted.",
+            [("", metrics.connections)],
+        ),
+        *metric(
+            "cable_club_rejections_total",
+            "counter",
+            "Connections rejected, by reason.",
+            labelled("reason", server.admission.rejected),
+        ),
+        *metric(
+            "cable_club_disconnects_total",
+            "counter",
+            "Connections closed, by reason.",
+            labelled("reason", metrics.disconnects),
+        ),
+        *metric(
+            "cable_club_received_bytes_total",
+            "counter",
+            "Bytes read from clients.",
+            [("", metrics.received_bytes)],
+        ),
+        *metric(
+            "cable_club_sent_bytes_total",
+            "counter",
+            "Bytes sent to clients.",
+            [("", server.sent_bytes)],
+        ),
+        *metric(
+            "cable_club_send_queue_bytes",
+            "gauge",
+            "Bytes waiting to be sent to clients.",
+            [("", queued)],
+        ),
+        *metrics.party_check.render(),
+        *metrics.matchmaking_wait.render(),
+        *metrics.loop_iteration.render(),
+        *server.extra_metrics(),
+    ]
+
+    return "\n".join(lines).encode(UTF8) + b"\n"
+
+
+def response(server: BaseServer) -> bytes:
+    """Build the HTTP response with a server's report."""
+    body = render(server)
+    head = (
+        "HTTP/1.0 200 OK\r\n"
+        f"Content-Type: {CONTENT_TYPE}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "\r\n"
+    )
+    return head.encode(UTF8) + body
@@ -0,0 +1,55 @@
+"""Forward bytes between two sockets without them going through Python."""
+
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from socket import socket
+
+SPLICE = hasattr(os, "splice")
+"""Whether the platform supports :py:func:`os.splice` (Linux only)."""
+
+CHUNK_SIZE = 1 << 16
+"""Maximum amount of bytes moved on each call."""
+
+
+class Pipe:
+    """Kernel-side buffer, bytes are spliced from a socket into it, then out of it.
+
+    Data never gets copied into userspace.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an instance."""
+        self.read_fd, self.write_fd = os.pipe()
+        self.pending = 0
+        """Amount of bytes in the pipe, waiting to be sent."""
+
+    def fill(self, socket: socket) -> int:
+        """Move incoming bytes from a socket into the pipe. Zero means EOF."""
+        n = os.splice(
+            socket.fileno(),
+            self.write_fd,
+            CHUNK_SIZE,
+            flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK,
+        )
+        self.pending += n
+        return n
+
+    def drain(self, socket: socket) -> int:
+        """Move as many bytes as possible from the pipe into a socket."""
+        n = os.splice(
+            self.read_fd,
+            socket.fileno(),
+            self.pending,
+            flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK,
+        )
+        self.pending -= n
+        return n
+
+    def close(self) -> None:
+        """Release the file descriptors."""
+        os.close(self.read_fd)
+        os.close(self.write_fd)
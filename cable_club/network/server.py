@@ -2,28 +2,68 @@
 
 from __future__ import annotations
 
+import contextlib
+import functools
 import logging
-import select
+import multiprocessing
+import selectors
+import signal
 import socket as s
+import struct
 import time
-from typing import TYPE_CHECKING
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Any, TypeVar, cast
 
 from cable_club import watcher
 from cable_club.data import models
 from cable_club.data.writer import Writer
 
-from .client import Client
-from .states import Connected, Finding
+from . import metrics
+from .admission import Admission, has_valid_prefix
+from .client import Client, SendQueue
+from .relay import SPLICE, Pipe
+from .states import (
+    Connected,
+    Connecting,
+    Finding,
+    Validating,
+    check_find_compact,
+    public_id,
+    start_matching,
+)
+from .timers import Timer, Timers
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+    from types import FrameType
+
     from cable_club.config import Config
 
+    from .timers import Cancellable
+
+
+T = TypeVar("T")
+
+RECV_SIZE = 1 << 16
+"""Maximum amount of bytes read from a socket on each call."""
+
+TCPI_UNACKED = 24
+"""Offset of ``tcpi_unacked`` on Linux's ``struct tcp_info``."""
+
+TCP_INFO_SIZE = TCPI_UNACKED + 4
+"""Amount of bytes of ``struct tcp_info`` that we need."""
+
+CLOSE_TIMEOUT = 2.0
+"""Seconds that a disconnected client has to take its last bytes, and hang up."""
 
 _logger = logging.getLogger(__name__)
 
 
-class Server:
-    """Model the server's logic."""
+class BaseServer(ABC):
+    """Model the server's logic, regardless of how sockets are handled."""
 
     def __init__(self, config: Config) -> None:
         """Initialize an instance."""
@@ -32,39 +72,64 @@ class Server:
 
         self.refresh_rules_at = time.monotonic()
         self.clients: dict[s.socket, Client] = {}
+        self.admission = Admission(config)
+
+        self.pool: ProcessPoolExecutor | None = None
+        """Processes where parties are validated. Only created if configured."""
+
+        self.sent_bytes = 0
+        """Amount of bytes sent to clients, for benchmarking."""
+        self.send_calls = 0
+        """Amount of calls made to send data to clients, for benchmarking."""
+        self.metrics = metrics.Metrics()
+
+        self.finding: dict[tuple[int, int], list[s.socket]] = {}
+        """Trainers waiting for their peer, keyed by (public id, peer's id).
+
+        Values are lists because public ids are only 16 bits, so they collide.
+        """
 
         _, self.rules_files = watcher.rules_changed(self.config.rules_dir, {})
-        self.rules = watcher.load_rules(self.config.rules_dir, self.rules_files)
+        self.load_rules()
+
+    @abstractmethod
+    def run(self) -> None:
+        """Execute the server's logic (blocking)."""
 
-    def select(self) -> tuple[list[s.socket], list[s.socket], list[s.socket]]:
-        """Thin wrapper on top of select.
+    @abstractmethod
+    def on_pending(self, socket: s.socket) -> None:
+        """Get notified that a client has data waiting to be sent."""
 
-        Collects all readers and writers and hands them off to select.select().
+    @abstractmethod
+    def close(self, socket: s.socket, client: Client, reason: str) -> None:
+        """Let the client know why it is being disconnected, and close the socket.
+
+        Must not block nor raise, the client is no longer being tracked.
         """
-        reads = list(self.clients)
-        reads.append(self.socket)
 
-        writes = [sock for sock, client in self.clients.items() if client.send_buffer]
+    @abstractmethod
+    def call_later(self, delay: float, callback: Callable[[], object]) -> Cancellable:
+        """Schedule a callback to be run after some seconds."""
 
-        return select.select(reads, writes, reads, 1.0)
+    @abstractmethod
+    def when_done(
+        self,
+        future: Future[T],
+        callback: Callable[[Future[T]], object],
+    ) -> None:
+        """Run a callback on the loop, once a future from another thread completes."""
 
-    def run(self) -> None:
-        """Execute the server's logic (blocking busy loop)."""
-        with s.socket(s.AF_INET, s.SOCK_STREAM) as self.socket:
-            self.socket.setsockopt(s.SOL_SOCKET, s.SO_REUSEADDR, 1)
-            self.socket.bind((self.config.host, self.config.port))
-            _logger.info("Started Server on %s:%d", self.config.host, self.config.port)
-            self.socket.listen()
-            try:
-                while True:
-                    self.maybe_reload_rules()
+    @abstractmethod
+    def add_signal_handler(self, signum: int, callback: Callable[[], object]) -> None:
+        """Run a callback on the loop, whenever a signal is received."""
 
-                    read, write, errors = self.select()
-                    self.handle_errors(errors)
-                    self.write_to_all(write)
-                    self.read_all(read)
-            except KeyboardInterrupt:
-                _logger.info("Stopping Server")
+    @abstractmethod
+    def pause_reading(self, socket: s.socket) -> None:
+        """Stop receiving data from a client."""
+
+    @abstractmethod
+    def resume_reading(self, socket: s.socket) -> None:
+        """Start receiving data from a client again."""
 
     def maybe_reload_rules(self) -> None:
         """Check the rules folder for updates.
@@ -81,91 +146,309 @@ class Server:
 
         if reload_rules:
             self.rules_files = rules_files
-            self.rules = watcher.load_rules(self.config.rules_dir, self.rules_files)
+            self.load_rules()
 
         self.refresh_rules_at = time.monotonic() + self.config.rules_refresh_rate
 
-    def handle_error(self, socket: s.socket) -> None:
-        """Handle a single error socket."""
-        if socket is self.socket:
-            msg = "Error on listening socket."
-            raise RuntimeError(msg)
+    def load_rules(self) -> None:
+        """Read the rules, and encode them once for every ``found`` message."""
+        self.rules = watcher.load_rules(self.config.rules_dir, self.rules_files)
 
-        self.disconnect(socket)
+        fields = [str(len(self.rules))]
+        for rule in self.rules:
+            fields.extend(rule)
+        self.rules_encoded = Writer.encode_fields(fields)
 
-    def handle_errors(self, sockets: list[s.socket]) -> None:
-        """Handle all error sockets."""
-        for socket in sockets:
-            self.handle_error(socket)
+    def schedule_rules_reload(self) -> None:
+        """Periodically check the rules folder for updates."""
+        self.maybe_reload_rules()
+        self.call_later(self.config.rules_refresh_rate, self.schedule_rules_reload)
 
-    def write_to(self, socket: s.socket) -> None:
-        """Write to a single socket."""
+    def add_client(self, socket: s.socket, address: tuple[str, int]) -> Client:
+        """Start tracking a newly accepted connection."""
+        client = Client(address, on_pending=functools.partial(self.on_pending, socket))
+        self.clients[socket] = client
+        self.admission.connected(address[0])
+        self.metrics.connections += 1
+        self.set_timeout(socket, client)
+        _logger.info("%s: connected", client)
+        return client
+
+    def set_timeout(self, socket: s.socket, client: Client) -> None:
+        """(Re)start the timer that kicks a client, based on its current state."""
+        if client.timer is not None:
+            client.timer.cancel()
+            client.timer = None
+
+        if isinstance(client.state, Connected):
+            timeout = self.config.idle_timeout
+        elif isinstance(client.state, Finding):
+            timeout = self.config.finding_timeout
+        else:
+            timeout = self.config.connecting_timeout
+
+        if timeout > 0:
+            callback = functools.partial(self.expire, socket)
+            client.timer = self.call_later(timeout, callback)
+
+    def expire(self, socket: s.socket) -> None:
+        """Kick a client that spent too long on its current state."""
+        client = self.clients.get(socket)
+        if client is None:
+            return
+
+        client.timer = None
+
+        # rather than restarting the timer on every message, check when it was
+        # last seen once the timer expires, and schedule a new one if needed
+        if isinstance(client.state, Connected):
+            remaining = client.last_seen + self.config.idle_timeout - time.monotonic()
+            if remaining > 0:
+                callback = functools.partial(self.expire, socket)
+                client.timer = self.call_later(remaining, callback)
+                return
+
+        self.disconnect(socket, "timed out")
+
+    def receive(self, socket: s.socket, recvd: bytes | memoryview) -> None:
+        """Split the incoming bytes into messages and feed them to the client."""
         client = self.clients[socket]
-        try:
-            buffer = client.send_buffer
-            n = socket.send(buffer)
-            _logger.debug("sent %s to %s", buffer, socket)
-            client.send_buffer = client.send_buffer[n:]
-        except s.error as e:  # noqa: UP024
-            # ruff complains that socket.error is an alias to OSError and should use
-            # it instead. however, keeping it like this in case this implementation
-            # detail changes and `socket.error` becomes something else
-            self.disconnect(socket, str(e))
+        client.last_seen = time.monotonic()
+        self.metrics.received_bytes += len(recvd)
+        buffer = client.recv_buffer
+        buffer += recvd
 
-    def write_to_all(self, sockets: list[s.socket]) -> None:
-        """Write to all sockets."""
-        for socket in sockets:
-            self.write_to(socket)
+        # drop scanners and the like before doing any actual work
+        if isinstance(client.state, Connecting) and not has_valid_prefix(buffer):
+            self.admission.reject(client.address[0], "not a cable_club message")
+            self.disconnect(socket, "not a cable_club message")
+            return
 
-    def read_from(self, socket: s.socket) -> None:
-        """Read from a single socket."""
-        if socket is self.socket:
-            new_sock, address = self.socket.accept()
-            # ruff doesnt like a boolean argument without any name
-            # but that's the function signature, nothing we can do here
-            new_sock.setblocking(False)  # noqa: FBT003
-            # NOTE: address is `Any` based on official Python hinting...
-            client = self.clients[new_sock] = Client(address)
-            _logger.info("%s: connected", client)
+        if self.config.raw_relay and isinstance(client.state, Connected):
+            # no need to split messages, just forward whatever came in
+            peer = self.clients.get(client.state.peer)
+            if peer is not None:
+                peer.queue(bytes(buffer))
+            buffer.clear()
+            self.check_backpressure(socket, client)
             return
 
+        max_size = self.config.max_message_size
+
+        # resume the search where previous call left it, rather than from the start
+        start = 0
+        end = buffer.find(b"\n", client.scanned)
+        with memoryview(buffer) as view:
+            while end != -1:
+                if end - start > max_size:
+                    break
+
+                message = bytes(view[start:end])
+                start = end + 1
+                self.handle(socket, client, message)
+
+                # got disconnected while handling the message
+                if socket not in self.clients:
+                    return
+
+                end = buffer.find(b"\n", start)
+
+        # No newline, buffer the partial message.
+        del buffer[:start]
+        client.scanned = len(buffer)
+
+        if client.scanned > max_size:
+            self.disconnect(socket, "message too long")
+            return
+
+        # parse the party as it comes in, rather than in a burst once it is complete
+        if buffer and isinstance(client.state, Connecting):
+            self.handle_partial(socket, client, buffer)
+            if socket not in self.clients:
+                return
+
+        self.check_backpressure(socket, client)
+
+    def check_backpressure(self, socket: s.socket, client: Client) -> None:
+        """Stop reading from a client if its peer is not keeping up."""
+        if not isinstance(client.state, Connected):
+            return
+
+        peer = self.clients.get(client.state.peer)
+        if peer is not None and len(peer.send_buffer) > self.config.high_watermark:
+            self.throttle(socket)
+
+    def throttle(self, socket: s.socket) -> None:
+        """Stop reading from a client, until its peer catches up."""
         client = self.clients[socket]
+        if client.throttled_at is not None:
+            return
+
+        client.throttled_at = time.monotonic()
+        self.pause_reading(socket)
+        _logger.debug("%s: throttled", client)
+
+    def unthrottle(self, socket: s.socket) -> None:
+        """Start reading from a client again, once its peer caught up."""
+        client = self.clients.get(socket)
+        if client is None or client.throttled_at is None:
+            return
+
+        client.throttled_for += time.monotonic() - client.throttled_at
+        client.throttled_at = None
+        self.resume_reading(socket)
+        _logger.debug("%s: unthrottled", client)
+
+    def handle(self, socket: s.socket, client: Client, message: bytes) -> None:
+        """Feed a single message to the client's state."""
+        _logger.debug("received: %s", message)
         try:
-            recvd = socket.recv(4096)
-        except ConnectionResetError:
-            self.disconnect(socket)
+            old = client.state
+            client.state, state_changed = old.handle(socket, self, message)
+
+            if state_changed:
+                _logger.debug("transition: %s -> %s", old, client.state)
+        except Exception as e:
+            msg = "server error"
+            _logger.exception(msg, exc_info=e)
+            self.disconnect(socket, msg)
+
+    def handle_partial(
+        self,
+        socket: s.socket,
+        client: Client,
+        partial: bytearray,
+    ) -> None:
+        """Feed the start of a ``find`` message to a connecting client's state."""
+        if not isinstance(client.state, Connecting):
             return
 
-        if not recvd:
-            # Zero-length read from a non-blocking socket is
-            # a disconnect.
-            self.disconnect(socket, "client disconnected")
+        try:
+            client.state.handle_partial(socket, self, partial)
+        except Exception as e:
+            msg = "server error"
+            _logger.exception(msg, exc_info=e)
+            self.disconnect(socket, msg)
+
+    def start_pool(self) -> ProcessPoolExecutor:
+        """Get the validation processes, starting them if needed."""
+        if self.pool is None:
+            # forked processes would inherit (and keep open) the clients' sockets
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.config.validation_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=models.configure,
+                initargs=(self.config,),
+            )
+
+        return self.pool
+
+    def validate(self, socket: s.socket, message: bytes) -> None:
+        """Parse and validate a ``find`` message on the pool, without blocking."""
+        pool = self.start_pool()
+        try:
+            future = pool.submit(check_find_compact, message, self.config.game_version)
+        except BrokenProcessPool:
+            # a process died while idle, this party is not to blame
+            self.discard_pool(pool)
+            pool = self.start_pool()
+            future = pool.submit(check_find_compact, message, self.config.game_version)
+
+        callback = functools.partial(
+            self.validated,
+            socket,
+            time.perf_counter(),
+            pool,
+        )
+        self.when_done(future, callback)
+
+    def validated(
+        self,
+        socket: s.socket,
+        started_at: float,
+        pool: ProcessPoolExecutor,
+        future: Future[Finding | str],
+    ) -> None:
+        """Start matchmaking for a client, once its party was validated."""
+        # includes the time spent waiting for a worker
+        self.metrics.party_check.observe(time.perf_counter() - started_at)
+
+        client = self.clients.get(socket)
+        # disconnected in the meantime
+        if client is None or not isinstance(client.state, Validating):
             return
 
-        recv_buffer = client.recv_buffer + recvd
-        while True:
-            message, sep, recv_buffer = recv_buffer.partition(b"\n")
-            if not sep:
-                # No newline, buffer the partial message.
-                client.recv_buffer = message
-                break
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            # this party may be what crashed it, do not try again
+            self.discard_pool(pool)
+            self.disconnect(socket, "server error")
+            return
+        except Exception as e:
+            msg = "server error"
+            _logger.exception(msg, exc_info=e)
+            self.disconnect(socket, msg)
+            return
 
-            _logger.debug("received: %s", message)
-            try:
-                old = client.state
-                client.state, state_changed = old.handle(socket, self, message)
-
-                if state_changed:
-                    _logger.debug("transition: %s -> %s", old, client.state)
-            except Exception as e:
-                msg = "server error"
-                _logger.exception(msg, exc_info=e)
-                self.disconnect(socket, msg)
-
-    def read_all(self, sockets: list[s.socket]) -> None:
-        """Read from all sockets."""
-        for socket in sockets:
-            self.read_from(socket)
+        if isinstance(result, str):
+            self.disconnect(socket, result)
+            return
+
+        start_matching(socket, self, result)
+
+    def discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Stop using a pool where a process died, next party starts a new one."""
+        if pool is not self.pool:
+            # replaced already
+            return
+
+        _logger.error("A validation process died, restarting them")
+        self.stop_pool()
+
+    def stop_pool(self) -> None:
+        """Shut the validation processes down, if any."""
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def peer_of(self, socket: s.socket) -> s.socket | None:
+        """Get the socket that a client is connected to, if any."""
+        client = self.clients.get(socket)
+        if client is None or not isinstance(client.state, Connected):
+            return None
+
+        if client.state.peer not in self.clients:
+            return None
+
+        return client.state.peer
+
+    def find_peer(self, state: Finding) -> s.socket | None:
+        """Get the (oldest) trainer waiting for the given one, if any."""
+        waiting = self.finding.get((state.peer_id, public_id(state.id)))
+        if not waiting:
+            return None
+
+        return waiting[0]
+
+    def start_finding(self, socket: s.socket, state: Finding) -> None:
+        """Add a trainer to the matchmaking index."""
+        key = (public_id(state.id), state.peer_id)
+        self.finding.setdefault(key, []).append(socket)
+        client = self.clients[socket]
+        client.finding_since = time.monotonic()
+        self.set_timeout(socket, client)
+
+    def stop_finding(self, socket: s.socket, state: Finding) -> None:
+        """Remove a trainer from the matchmaking index."""
+        key = (public_id(state.id), state.peer_id)
+        waiting = self.finding.get(key)
+        if waiting is None or socket not in waiting:
+            return
+
+        waiting.remove(socket)
+        if not waiting:
+            del self.finding[key]
 
     def connect(self, s_connecting: s.socket, s_finding: s.socket) -> None:
         """Tell two clients about each other's existence."""
@@ -197,12 +480,33 @@ class Server:
         writer.send(c_finding)
 
         # mark them as connected
+        self.stop_finding(s_connecting, c_connecting.state)
+        self.stop_finding(s_finding, c_finding.state)
         c_connecting.state = Connected(s_finding)
         c_finding.state = Connected(s_connecting)
+        wait = time.monotonic() - c_finding.finding_since
+        self.metrics.matchmaking_wait.observe(wait)
+        self.set_timeout(s_connecting, c_connecting)
+        self.set_timeout(s_finding, c_finding)
         _logger.info("%s: connected to %s", c_connecting, c_finding)
 
     def disconnect(self, socket: s.socket, reason: str = "unknown error") -> None:
-        """Close a client's connection."""
+        """Close a client's connection, and its peer's (if connected)."""
+        client = self.forget(socket, reason)
+        if client is None:
+            return
+
+        self.close(socket, client, reason)
+
+        # both ends are torn down together, no need to recurse
+        if isinstance(client.state, Connected):
+            peer = client.state.peer
+            peer_client = self.forget(peer, "peer disconnected")
+            if peer_client is not None:
+                self.close(peer, peer_client, "peer disconnected")
+
+    def forget(self, socket: s.socket, reason: str) -> Client | None:
+        """Stop tracking a client, return it (None if it was not being tracked)."""
         _logger.debug("disconnecting %s. reason: %s", socket, reason)
 
         try:
@@ -211,24 +515,608 @@ class Server:
         # vulnerabilities). socket wasn't setup as a client yet and thus .pop() fails...
         # instead of cluttering logs with it, lets just ignore the exception
         except KeyError:
+            return None
+
+        self.metrics.disconnects[metrics.disconnect_reason(reason)] += 1
+
+        if isinstance(client.state, Finding):
+            self.stop_finding(socket, client.state)
+
+        if client.timer is not None:
+            client.timer.cancel()
+
+        self.admission.disconnected(client.address[0])
+
+        if client.throttled_at is not None:
+            client.throttled_for += time.monotonic() - client.throttled_at
+        if client.throttled_for:
+            _logger.info("%s: throttled for %.3fs", client, client.throttled_for)
+
+        return client
+
+    def extra_metrics(self) -> list[str]:
+        """Report backend-specific metrics."""
+        return []
+
+    def write_server_rules(self, writer: Writer) -> None:
+        """Dump server's rules into a writer."""
+        writer.splice(self.rules_encoded)
+
+
+class Closing:
+    """A connection on its way out, see :py:meth:`Server.close`."""
+
+    __slots__ = ("buffer", "shut", "timer")
+
+    def __init__(self, buffer: SendQueue, timer: Timer) -> None:
+        """Initialize an instance."""
+        self.buffer = buffer
+        """Last bytes to be sent (eg: ending with the reason to disconnect)."""
+        self.shut = False
+        """Whether our side was shut down, waiting for the peer to hang up."""
+        self.timer = timer
+        """Closes the socket, whatever its state, after CLOSE_TIMEOUT."""
+
+
+class Server(BaseServer):
+    """Blocking loop on top of :py:mod:`selectors` (eg: epoll on Linux).
+
+    Sockets are registered once, and write interest is only toggled when a
+    client's send buffer goes from empty to non-empty and back. Thus, idle clients
+    cost nothing on each iteration.
+    """
+
+    reuse_port = False
+    """Whether other processes can listen on the same port (SO_REUSEPORT)."""
+
+    def __init__(self, config: Config) -> None:
+        """Initialize an instance."""
+        self.timers = Timers()
+        super().__init__(config)
+        self.selector = selectors.DefaultSelector()
+
+        self.running = True
+        """Cleared to get out of :py:meth:`run`."""
+
+        self.metrics_socket: s.socket | None = None
+        """Where metrics are served, if enabled."""
+        self.scrapers: set[s.socket] = set()
+        """Connections asking for metrics."""
+        self.reading = True
+        """Whether clients are being read from at all."""
+
+        self.pipes: dict[s.socket, Pipe] = {}
+        """Bytes read from a client, on their way to its peer (raw relay only)."""
+
+        self.recv_view = memoryview(bytearray(RECV_SIZE))
+        """Preallocated buffer where data is received, before being copied."""
+
+        self.waker: tuple[s.socket, s.socket] | None = None
+        """Lets other threads wake the loop up, see :py:meth:`when_done`."""
+        self.done: deque[tuple[Callable[[Future[Any]], object], Future[Any]]]
+        self.done = deque()
+        """Futures completed by other threads, and their callbacks."""
+        self.signalled: deque[Callable[[], object]] = deque()
+        """Callbacks of the signals received, see :py:meth:`add_signal_handler`."""
+        self.wakeup_fd = False
+        """Whether signals wake the loop up, through the waker."""
+
+        self.closing: dict[s.socket, Closing] = {}
+        """Disconnected clients, sending their last bytes."""
+        self.to_close: deque[s.socket] = deque()
+        """Clients disconnected on this iteration, handled at its end."""
+
+        self.accepted = 0
+        """Amount of connections accepted."""
+        self.accept_batches = 0
+        """Amount of times that the listening socket was drained."""
+        self.largest_accept_batch = 0
+        """Most connections accepted on a single iteration."""
+        self.accept_budget_exhausted = 0
+        """Times that connections were left waiting, because of ACCEPT_BUDGET."""
+
+    def select(self) -> list[tuple[selectors.SelectorKey, int]]:
+        """Thin wrapper on top of the selector, wait for sockets to be ready.
+
+        Waits, at most, until the next timer is due. Does not wait if some clients
+        were disconnected from outside the loop, they have to be closed.
+        """
+        timeout = 0 if self.to_close else self.timers.timeout()
+        return self.selector.select(timeout)
+
+    def call_later(self, delay: float, callback: Callable[[], object]) -> Timer:
+        """Schedule a callback to be run after some seconds."""
+        return self.timers.call_later(delay, callback)
+
+    def listen(self) -> None:
+        """Open the listening socket."""
+        self.socket = s.socket(s.AF_INET, s.SOCK_STREAM)
+        self.socket.setsockopt(s.SOL_SOCKET, s.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            self.socket.setsockopt(s.SOL_SOCKET, s.SO_REUSEPORT, 1)
+        self.socket.bind((self.config.host, self.config.port))
+        _logger.info("Started Server on %s:%d", self.config.host, self.config.port)
+        self.socket.listen(self.config.listen_backlog)
+        # accept() is called in a loop, until there are no connections left
+        self.socket.setblocking(False)  # noqa: FBT003
+        self.selector.register(self.socket, selectors.EVENT_READ)
+        self.schedule_rules_reload()
+        self.listen_metrics()
+
+    def listen_metrics(self) -> None:
+        """Open the metrics' listening socket, if enabled."""
+        if not self.config.metrics_port:
+            return
+
+        self.metrics_socket = s.socket(s.AF_INET, s.SOCK_STREAM)
+        self.metrics_socket.setsockopt(s.SOL_SOCKET, s.SO_REUSEADDR, 1)
+        self.metrics_socket.bind((self.config.metrics_host, self.metrics_port()))
+        self.metrics_socket.listen()
+        _logger.info("Serving metrics on port %d", self.metrics_port())
+        self.metrics_socket.setblocking(False)  # noqa: FBT003
+        self.selector.register(self.metrics_socket, selectors.EVENT_READ)
+
+    def metrics_port(self) -> int:
+        """Port where this server's metrics are served."""
+        return self.config.metrics_port
+
+    def close_metrics(self) -> None:
+        """Stop serving metrics."""
+        if self.metrics_socket is None:
+            return
+
+        self.selector.unregister(self.metrics_socket)
+        self.metrics_socket.close()
+        self.metrics_socket = None
+        for sock in self.scrapers:
+            self.selector.unregister(sock)
+            sock.close()
+        self.scrapers.clear()
+
+    def scrape(self, socket: s.socket) -> None:
+        """Answer a request for metrics, whatever it was."""
+        if socket is self.metrics_socket:
+            with contextlib.suppress(BlockingIOError):
+                conn, _ = socket.accept()
+                conn.setblocking(False)  # noqa: FBT003
+                self.scrapers.add(conn)
+                self.selector.register(conn, selectors.EVENT_READ)
             return
 
         try:
-            writer = Writer()
-            writer.add("disconnect")
-            writer.add(reason)
-            writer.send_now(socket)
+            socket.recv(RECV_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.scrapers.discard(socket)
+            self.set_events(socket, 0)
             socket.close()
-        except Exception as e:
-            _logger.exception("Couldnt send reason to socket", exc_info=e)
             return
 
-        # disconnect the other end
+        # sent without blocking, like the last bytes to a disconnected client
+        self.scrapers.discard(socket)
+        buffer = SendQueue()
+        buffer.append(metrics.response(self))
+        finish = functools.partial(self.finish_close, socket)
+        self.closing[socket] = Closing(buffer, self.call_later(CLOSE_TIMEOUT, finish))
+        self.linger(socket)
+
+    def tick(self) -> None:
+        """Run a single iteration of the loop."""
+        events = self.select()
+        start = time.perf_counter()
+
+        for key, mask in events:
+            self.handle_events(cast(s.socket, key.fileobj), mask)
+
+        self.timers.run()
+        self.close_pending()
+        self.metrics.loop_iteration.observe(time.perf_counter() - start)
+
+    def run(self) -> None:
+        """Execute the server's logic (blocking busy loop)."""
+        self.listen()
+        with self.socket:
+            try:
+                while self.running:
+                    self.tick()
+            except KeyboardInterrupt:
+                _logger.info("Stopping Server")
+            finally:
+                self.shutdown()
+
+    def shutdown(self) -> None:
+        """Release the resources used by the loop, not the listening socket."""
+        self.close_metrics()
+        for socket in list(self.closing):
+            self.finish_close(socket)
+        self.selector.close()
+        self.stop_pool()
+        if self.wakeup_fd:
+            signal.set_wakeup_fd(-1)
+            self.wakeup_fd = False
+        if self.waker is not None:
+            for sock in self.waker:
+                sock.close()
+            self.waker = None
+
+    def handle_events(self, socket: s.socket, events: int) -> None:
+        """Handle a socket that is ready to be written and/or read."""
+        if socket is self.socket:
+            self.accept()
+            return
+
+        if self.waker is not None and socket is self.waker[0]:
+            self.run_done()
+            return
+
+        if socket is self.metrics_socket or socket in self.scrapers:
+            self.scrape(socket)
+            return
+
+        if socket in self.closing:
+            self.linger(socket)
+            return
+
+        # may have been disconnected while handling another socket on this iteration
+        if events & selectors.EVENT_WRITE and socket in self.clients:
+            self.write_to(socket)
+
+        if events & selectors.EVENT_READ and socket in self.clients:
+            self.read_from(socket)
+
+    def when_done(
+        self,
+        future: Future[T],
+        callback: Callable[[Future[T]], object],
+    ) -> None:
+        """Run a callback on the loop, once a future from another thread completes.
+
+        The callback gets queued, and a byte is written on a socketpair, which
+        wakes the selector up.
+        """
+        write_end = self.get_waker()
+
+        def wake(future: Future[T]) -> None:
+            # runs on the executor's thread
+            self.done.append((callback, future))
+            # if the buffer is full, the loop will wake up anyway
+            with contextlib.suppress(BlockingIOError):
+                write_end.send(b"\0")
+
+        future.add_done_callback(wake)
+
+    def add_signal_handler(self, signum: int, callback: Callable[[], object]) -> None:
+        """Run a callback on the loop, whenever a signal is received.
+
+        The handler only queues the callback, while the signal's number is written
+        on the waker (see :py:func:`signal.set_wakeup_fd`). Thus, the callback runs
+        right away, rather than once :py:meth:`select` times out.
+        """
+        write_end = self.get_waker()
+        signal.set_wakeup_fd(write_end.fileno(), warn_on_full_buffer=False)
+        self.wakeup_fd = True
+
+        def handler(signum: int, frame: FrameType | None) -> None:  # noqa: ARG001
+            self.signalled.append(callback)
+
+        signal.signal(signum, handler)
+
+    def get_waker(self) -> s.socket:
+        """Get the writing end of the socketpair that wakes the loop up."""
+        if self.waker is None:
+            self.waker = s.socketpair()
+            for sock in self.waker:
+                sock.setblocking(False)  # noqa: FBT003
+            self.selector.register(self.waker[0], selectors.EVENT_READ)
+
+        return self.waker[1]
+
+    def run_done(self) -> None:
+        """Run the callbacks of completed futures, and received signals."""
+        read_end, _ = cast(tuple[s.socket, s.socket], self.waker)
+        with contextlib.suppress(BlockingIOError):
+            while read_end.recv(RECV_SIZE):
+                pass
+
+        while self.done:
+            callback, future = self.done.popleft()
+            callback(future)
+
+        while self.signalled:
+            self.signalled.popleft()()
+
+    def on_pending(self, socket: s.socket) -> None:
+        """Start watching for the socket to be writable."""
+        self.watch(socket)
+
+    def pause_reading(self, socket: s.socket) -> None:
+        """Stop watching for the socket to be readable."""
+        self.watch(socket)
+
+    def resume_reading(self, socket: s.socket) -> None:
+        """Start watching for the socket to be readable again."""
+        self.watch(socket)
+
+    def incoming(self, client: Client) -> Pipe | None:
+        """Get the pipe with the bytes on their way to a client, if any."""
+        if not isinstance(client.state, Connected):
+            return None
+
+        return self.pipes.get(client.state.peer)
+
+    def watch(self, socket: s.socket) -> None:
+        """Update the events that the selector will report for a client."""
+        client = self.clients[socket]
+
+        events = 0
+
+        # dont read more data until the previous one got forwarded
+        pipe = self.pipes.get(socket)
+        if (
+            self.reading
+            and client.throttled_at is None
+            and (pipe is None or not pipe.pending)
+        ):
+            events |= selectors.EVENT_READ
+
+        pipe = self.incoming(client)
+        if client.send_buffer or (pipe is not None and pipe.pending):
+            events |= selectors.EVENT_WRITE
+
+        self.set_events(socket, events)
+
+    def set_events(self, socket: s.socket, events: int) -> None:
+        """(Un)register a socket on the selector, or change its events."""
+        try:
+            key = self.selector.get_key(socket)
+        except KeyError:
+            if events:
+                self.selector.register(socket, events)
+            return
+
+        if not events:
+            self.selector.unregister(socket)
+        elif key.events != events:
+            self.selector.modify(socket, events)
+
+    def write_to(self, socket: s.socket) -> None:
+        """Write to a single socket."""
+        client = self.clients[socket]
+        pipe = self.incoming(client)
+        try:
+            # buffer is full, will retry once writable
+            with contextlib.suppress(BlockingIOError):
+                if client.send_buffer:
+                    n = client.send_buffer.send(socket)
+                    _logger.debug("sent %d bytes to %s", n, socket)
+                    self.send_calls += 1
+                    self.sent_bytes += n
+
+                # raw relay: bytes on the pipe came after the ones on the buffer
+                if pipe is not None and pipe.pending and not client.send_buffer:
+                    self.send_calls += 1
+                    self.sent_bytes += pipe.drain(socket)
+        except s.error as e:  # noqa: UP024
+            # ruff complains that socket.error is an alias to OSError and should use
+            # it instead. however, keeping it like this in case this implementation
+            # detail changes and `socket.error` becomes something else
+            self.disconnect(socket, str(e))
+            return
+
+        self.watch(socket)
+
         if isinstance(client.state, Connected):
-            self.disconnect(client.state.peer, "peer disconnected")
+            if len(client.send_buffer) <= self.config.low_watermark:
+                self.unthrottle(client.state.peer)
 
-    def write_server_rules(self, writer: Writer) -> None:
-        """Dump server's rules into a writer."""
-        writer.add(len(self.rules))
-        for r in self.rules:
-            writer.add_raw(r)
+            # peer may be able to read again
+            if pipe is not None:
+                self.watch(client.state.peer)
+
+    def accept(self) -> None:
+        """Accept the pending connections, up to ACCEPT_BUDGET of them.
+
+        Draining the queue at once absorbs connection storms in a few iterations,
+        while the budget prevents them from starving the already connected clients.
+        """
+        budget = self.config.accept_budget
+        n = 0
+        while n < budget:
+            try:
+                new_sock, address = self.socket.accept()
+            except BlockingIOError:
+                break
+            except OSError as e:
+                # eg: too many open files, retry on next iteration
+                _logger.warning("Could not accept connection: %s", e)
+                break
+
+            n += 1
+            self.add_connection(new_sock, address)
+        else:
+            self.accept_budget_exhausted += 1
+
+        self.accepted += n
+        self.accept_batches += 1
+        self.largest_accept_batch = max(self.largest_accept_batch, n)
+
+    def add_connection(self, new_sock: s.socket, address: tuple[str, int]) -> None:
+        """Set up a newly accepted socket."""
+        if self.admission.admit(address[0]) is not None:
+            new_sock.close()
+            return
+
+        # ruff doesnt like a boolean argument without any name
+        # but that's the function signature, nothing we can do here
+        new_sock.setblocking(False)  # noqa: FBT003
+        self.set_events(new_sock, selectors.EVENT_READ)
+        self.add_client(new_sock, address)
+
+    def extra_metrics(self) -> list[str]:
+        """Report the accept loop's metrics."""
+        return [
+            *metrics.metric(
+                "cable_club_accept_batches_total",
+                "counter",
+                "Times that the listening socket was drained.",
+                [("", self.accept_batches)],
+            ),
+            *metrics.metric(
+                "cable_club_accept_budget_exhausted_total",
+                "counter",
+                "Times that connections were left waiting, because of ACCEPT_BUDGET.",
+                [("", self.accept_budget_exhausted)],
+            ),
+            *metrics.metric(
+                "cable_club_accept_queue_depth",
+                "gauge",
+                "Connections waiting to be accepted.",
+                [("", self.accept_queue_depth() or 0)],
+            ),
+        ]
+
+    def accept_queue_depth(self) -> int | None:
+        """Get the amount of connections waiting to be accepted, None if unknown.
+
+        Only on Linux, where TCP_INFO's ``tcpi_unacked`` holds this value for
+        listening sockets.
+        """
+        if not hasattr(s, "TCP_INFO"):
+            return None
+
+        info = self.socket.getsockopt(s.IPPROTO_TCP, s.TCP_INFO, TCP_INFO_SIZE)
+        if len(info) < TCP_INFO_SIZE:
+            return None
+
+        (unacked,) = struct.unpack_from("I", info, TCPI_UNACKED)
+        return cast(int, unacked)
+
+    def read_from(self, socket: s.socket) -> None:
+        """Read from a single socket."""
+        if socket in self.pipes:
+            self.splice(socket)
+            return
+
+        try:
+            n = socket.recv_into(self.recv_view)
+        except ConnectionResetError:
+            self.disconnect(socket)
+            return
+
+        if not n:
+            # Zero-length read from a non-blocking socket is
+            # a disconnect.
+            self.disconnect(socket, "client disconnected")
+            return
+
+        self.receive(socket, self.recv_view[:n])
+
+    def splice(self, socket: s.socket) -> None:
+        """Move incoming bytes into the pipe towards the peer, and try to send them."""
+        client = self.clients[socket]
+        client.last_seen = time.monotonic()
+        peer = cast(Connected, client.state).peer
+        if peer not in self.clients:
+            self.disconnect(socket, "peer disconnected")
+            return
+
+        # partial message that arrived before switching into raw relay
+        if client.recv_buffer:
+            self.clients[peer].queue(bytes(client.recv_buffer))
+            client.recv_buffer.clear()
+
+        try:
+            n = self.pipes[socket].fill(socket)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.disconnect(socket, str(e))
+            return
+
+        if not n:
+            self.disconnect(socket, "client disconnected")
+            return
+
+        self.metrics.received_bytes += n
+
+        # forward right away, rather than waiting for next iteration
+        self.write_to(peer)
+
+    def connect(self, s_connecting: s.socket, s_finding: s.socket) -> None:
+        """Tell two clients about each other, and set up raw relay if enabled."""
+        super().connect(s_connecting, s_finding)
+
+        if isinstance(self.clients[s_connecting].state, Connected):
+            self.pair_up(s_connecting, s_finding)
+
+    def pair_up(self, socket: s.socket, peer: s.socket) -> None:
+        """Set up the raw relay between two connected clients, if enabled."""
+        if self.config.raw_relay and SPLICE:
+            self.pipes[socket] = Pipe()
+            self.pipes[peer] = Pipe()
+
+    def close(self, socket: s.socket, client: Client, reason: str) -> None:
+        """Queue the reason after the client's pending data, and close it later on.
+
+        Sockets are handled all at once, at the end of the iteration. See
+        :py:meth:`close_pending`.
+        """
+        pipe = self.pipes.pop(socket, None)
+        if pipe is not None:
+            pipe.close()
+
+        writer = Writer()
+        writer.add("disconnect")
+        writer.add(reason)
+        client.send_buffer.append(writer.encode())
+
+        finish = functools.partial(self.finish_close, socket)
+        timer = self.call_later(CLOSE_TIMEOUT, finish)
+        self.closing[socket] = Closing(client.send_buffer, timer)
+        self.to_close.append(socket)
+
+    def close_pending(self) -> None:
+        """Start closing the clients disconnected on this iteration, all at once."""
+        while self.to_close:
+            socket = self.to_close.popleft()
+            # may have finished already, if it got an event on this same iteration
+            if socket in self.closing:
+                self.linger(socket)
+
+    def linger(self, socket: s.socket) -> None:
+        """Send the last bytes to a closing client, then wait for it to hang up.
+
+        Closing right away could reset the connection (if it sent more data),
+        dropping the bytes not yet delivered. Never blocks.
+        """
+        closing = self.closing[socket]
+        try:
+            with contextlib.suppress(BlockingIOError):
+                if closing.buffer:
+                    closing.buffer.send(socket)
+
+                if not closing.buffer and not closing.shut:
+                    socket.shutdown(s.SHUT_WR)
+                    closing.shut = True
+
+                # anything received now is discarded, until EOF
+                if closing.shut and not socket.recv(RECV_SIZE):
+                    self.finish_close(socket)
+                    return
+        except OSError:
+            self.finish_close(socket)
+            return
+
+        events = selectors.EVENT_READ if closing.shut else selectors.EVENT_WRITE
+        self.set_events(socket, events)
+
+    def finish_close(self, socket: s.socket) -> None:
+        """Close the socket of a disconnected client."""
+        closing = self.closing.pop(socket, None)
+        if closing is None:
+            return
+
+        closing.timer.cancel()
+        self.set_events(socket, 0)
+        socket.close()
@@ -3,20 +3,21 @@
 from __future__ import annotations
 
 import logging
+import time
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING
 
 from cable_club import exceptions
 from cable_club.data import models
-from cable_club.data.reader import Reader
+from cable_club.data.reader import StreamReader
+from cable_club.data.writer import Writer
 from cable_club.version import Version
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
     from socket import socket
 
-    from cable_club.data.writer import Writer
-
-    from .server import Server
+    from .server import BaseServer
 
 _logger = logging.getLogger(__name__)
 
@@ -28,7 +29,7 @@ class State(ABC):
     def handle(
         self,
         socket: socket,
-        server: Server,
+        server: BaseServer,
         message: bytes,
     ) -> tuple[State, bool]:
         """Handle a message and return the new state, usually the current one (self).
@@ -40,87 +41,82 @@ class State(ABC):
 class Connecting(State):
     """Establishing a connection to the server."""
 
+    def __init__(self) -> None:
+        """Initialize an instance."""
+        self.parser: FindParser | None = None
+        """Parses the ``find`` message as it comes in, created on its first bytes."""
+        self.fed = 0
+        """Bytes of the message that were given to the parser already."""
+        self.elapsed = 0.0
+        """Time spent on the parser so far."""
+
+    def get_parser(self, server: BaseServer) -> FindParser:
+        """Get the parser, creating it if needed."""
+        if self.parser is None:
+            self.parser = FindParser(server.config.game_version)
+        return self.parser
+
+    def handle_partial(
+        self,
+        socket: socket,
+        server: BaseServer,
+        partial: bytes | bytearray,
+    ) -> None:
+        """Parse whatever came in of the message, kick the client if it is wrong."""
+        if server.config.validation_workers:
+            return
+
+        data = bytes(partial[self.fed :])
+        self.fed = len(partial)
+
+        start = time.perf_counter()
+        reason = self.get_parser(server).feed(data)
+        self.elapsed += time.perf_counter() - start
+
+        if reason is not None:
+            server.metrics.party_check.observe(self.elapsed)
+            server.disconnect(socket, reason)
+
     def handle(
         self,
         socket: socket,
-        server: Server,
+        server: BaseServer,
         message: bytes,
     ) -> tuple[State, bool]:
         """Validate the party, and connect to peer if possible."""
-        reader = Reader.new(message)
-        if reader is None:
-            server.disconnect(socket, "invalid content")
-            return self, False
+        if server.config.validation_workers:
+            server.validate(socket, message)
+            return Validating(), True
 
-        if reader.consume() != "find":
-            server.disconnect(socket, "not a cable_club message")
-            return self, False
+        start = time.perf_counter()
+        result = self.get_parser(server).finish(message[self.fed :])
+        self.elapsed += time.perf_counter() - start
 
-        version = reader.consume()
-        if not Version(version) >= server.config.game_version:
-            server.disconnect(socket, "invalid version")
+        server.metrics.party_check.observe(self.elapsed)
+        if isinstance(result, str):
+            server.disconnect(socket, result)
             return self, False
 
-        peer_id = int(reader.consume())
-        name = reader.consume()
-        id_ = int(reader.consume())
-        trainertype = reader.consume()
-        win_text = reader.consume()
-        lose_text = reader.consume()
-        party_raw = reader.raw_all()
-
-        try:
-            party = models.Party.read_from(reader)
-        except exceptions.ExhaustedReaderError:
-            msg = "party's stream was incomplete."
-            server.disconnect(socket, msg)
-            return self, False
-        except exceptions.ValidationError:
-            msg = "invalid party"
-            server.disconnect(socket, msg)
-            return self, False
-
-        state = Finding(
-            peer_id=peer_id,
-            name=name,
-            id_=id_,
-            trainertype=trainertype,
-            win_text=win_text,
-            lose_text=lose_text,
-            party=party,
-            party_raw=party_raw,
-        )
-
-        server.clients[socket].state = state
-
-        _logger.debug(
-            "Trainer %s, id %d (%s) -> Finding %d",
-            state.name,
-            public_id(state.id),
-            hex(state.id),
-            state.peer_id,
-        )
-
-        # Is the peer already waiting?
-        for other_socket, other_client in server.clients.items():
-            # dont try and connect a server to itself
-            if other_socket is socket:
-                continue
-
-            other_state = other_client.state
-            if (
-                isinstance(other_state, Finding)
-                and public_id(other_state.id) == state.peer_id
-                and other_state.peer_id == public_id(state.id)
-            ):
-                server.connect(socket, other_socket)
-                break
+        start_matching(socket, server, result)
 
         # we have set the socket's state already, return it just in case
         # and False ("no change") to prevent duplicated work or even messing states up
         return server.clients[socket].state, False
 
 
+class Validating(State):
+    """Party being validated on another process."""
+
+    def handle(
+        self,
+        socket: socket,  # noqa: ARG002
+        server: BaseServer,  # noqa: ARG002
+        message: bytes,  # noqa: ARG002
+    ) -> tuple[State, bool]:
+        """Ignore messages until validated."""
+        return self, False
+
+
 class Finding(State):
     """Looking for a match."""
 
@@ -133,8 +129,8 @@ class Finding(State):
         trainertype: str,
         win_text: str,
         lose_text: str,
-        party: models.Party,
-        party_raw: list[str],
+        party: models.Party | None,
+        party_raw: bytes,
     ) -> None:
         """Initialize an instance."""
         self.peer_id = peer_id
@@ -144,24 +140,40 @@ class Finding(State):
         self.win_text = win_text
         self.lose_text = lose_text
         self.party = party
+        """None when validated on another process, it is not sent back."""
         self.party_raw = party_raw
+        """Party's fields, encoded as they are sent (see :py:meth:`Writer.splice`)."""
 
     def handle(
         self,
         socket: socket,  # noqa: ARG002
-        server: Server,  # noqa: ARG002
+        server: BaseServer,  # noqa: ARG002
         message: bytes,  # noqa: ARG002
     ) -> tuple[State, bool]:
         """Ignore messages until connected."""
         return self, False
 
+    def encode(self, game_version: Version) -> bytes:
+        """Rebuild the ``find`` message that led to this state."""
+        writer = Writer()
+        writer.add("find")
+        writer.add(game_version)
+        writer.add(self.peer_id)
+        writer.add(self.name)
+        writer.add(self.id)
+        writer.add(self.trainertype)
+        writer.add(self.win_text)
+        writer.add(self.lose_text)
+        writer.splice(self.party_raw)
+        return writer.encode()
+
     def write(self, writer: Writer) -> None:
         """Dump this state into the received writer."""
         writer.add(self.name)
         writer.add(self.trainertype)
         writer.add(self.win_text)
         writer.add(self.lose_text)
-        writer.add_raw(self.party_raw)
+        writer.splice(self.party_raw)
 
 
 class Connected(State):
@@ -176,14 +188,14 @@ class Connected(State):
     def handle(
         self,
         socket: socket,  # noqa: ARG002
-        server: Server,
+        server: BaseServer,
         message: bytes,
     ) -> tuple[State, bool]:
         """Forward messages to the peer."""
         state = server.clients.get(self.peer)
 
         if state:
-            state.send_buffer += message + b"\n"
+            state.queue(message + b"\n")
         else:
             _logger.debug("%s: message dropped (no peer)", state)
 
@@ -193,3 +205,170 @@ class Connected(State):
 def public_id(id_: int) -> int:
     """Trim an arbitrary int into the expected size."""
     return id_ & 0xFFFF
+
+
+class FindParser:
+    """Parse and validate a ``find`` message as it comes in.
+
+    Data is parsed in steps (the header, the amount of Pokemon, each Pokemon...),
+    a step that runs out of fields is retried once more of them are available. This
+    way, a wrong party is rejected at its first wrong field.
+    """
+
+    def __init__(self, game_version: Version) -> None:
+        """Initialize an instance."""
+        self.game_version = game_version
+        self.reader = StreamReader()
+        self.step: Callable[[], Finding | str | None] = self.read_header
+        self.needed = 0
+        """Fields that must be available before the current step is retried."""
+
+        self.header: tuple[int, str, int, str, str, str] | None = None
+        self.party = models.Party()
+        self.party_start = 0
+        """Index of the party's first field."""
+
+    def feed(self, data: bytes) -> str | None:
+        """Parse some more data, return the reason if it is wrong already."""
+        result = self.parse(data, last=False)
+        # can not be a Finding, the last step waits for the end of the message
+        return result if isinstance(result, str) else None
+
+    def finish(self, data: bytes) -> Finding | str:
+        """Parse the end of the message, return the reason if it is wrong."""
+        result = self.parse(data, last=True)
+        if result is None:
+            msg = "Parser asked for more data after the end of the message."
+            raise RuntimeError(msg)
+        return result
+
+    def parse(self, data: bytes, *, last: bool) -> Finding | str | None:
+        """Run as many steps as possible, None if more data is needed."""
+        reader = self.reader
+        if not reader.feed(data, last=last):
+            return "invalid content"
+
+        if len(reader.fields) < self.needed and not last:
+            return None
+
+        while True:
+            start = reader.cursor
+            try:
+                result = self.step()
+            except exceptions.ExhaustedReaderError:
+                if last:
+                    return "party's stream was incomplete."
+
+                # wait until the fields for this step double, rather than retrying
+                # on every new one, so that trickling data in does not cost more
+                available = len(reader.fields)
+                self.needed = available + max(1, available - start)
+                reader.cursor = start
+                return None
+            except exceptions.ValidationError:
+                return "invalid party"
+
+            if result is not None:
+                return result
+
+    def read_header(self) -> str | None:
+        """Check the fields before the party."""
+        reader = self.reader
+        if reader.consume() != "find":
+            return "not a cable_club message"
+
+        version = reader.consume()
+        if not Version(version) >= self.game_version:
+            return "invalid version"
+
+        self.header = (
+            int(reader.consume()),  # peer_id
+            reader.consume(),  # name
+            int(reader.consume()),  # id
+            reader.consume(),  # trainertype
+            reader.consume(),  # win_text
+            reader.consume(),  # lose_text
+        )
+        self.party_start = reader.cursor
+        self.step = self.read_party
+        return None
+
+    def read_party(self) -> None:
+        """Read the amount of Pokemon."""
+        self.party.read_start(self.reader)
+        self.step = self.read_pokemon
+
+    def read_pokemon(self) -> None:
+        """Read the next Pokemon, if any."""
+        if self.party.complete():
+            self.step = self.read_end
+            return
+
+        self.party.read_pokemon(self.reader)
+
+    def read_end(self) -> Finding:
+        """Check that nothing comes after the party, once the message is over."""
+        reader = self.reader
+        self.party.read_end(reader)
+        if not reader.done:
+            # nothing extra yet, but the message may go on
+            raise exceptions.ExhaustedReaderError
+
+        self.party.validate()
+
+        if self.header is None:
+            msg = "Reached the end before reading the header."
+            raise RuntimeError(msg)
+        peer_id, name, id_, trainertype, win_text, lose_text = self.header
+
+        # encoded once rather than on every match
+        reader.cursor = self.party_start
+        party_raw = Writer.encode_fields(reader.raw_all())
+
+        return Finding(
+            peer_id=peer_id,
+            name=name,
+            id_=id_,
+            trainertype=trainertype,
+            win_text=win_text,
+            lose_text=lose_text,
+            party=self.party,
+            party_raw=party_raw,
+        )
+
+
+def check_find(message: bytes, game_version: Version) -> Finding | str:
+    """Parse and validate a ``find`` message, return the reason if it is wrong."""
+    return FindParser(game_version).finish(message)
+
+
+def check_find_compact(message: bytes, game_version: Version) -> Finding | str:
+    """Run :py:func:`check_find`, dropping the party's model from the result.
+
+    Runs on worker processes, this way less data has to be sent back.
+    """
+    result = check_find(message, game_version)
+    if isinstance(result, Finding):
+        result.party = None
+    return result
+
+
+def start_matching(socket: socket, server: BaseServer, state: Finding) -> None:
+    """Move a client into Finding, and connect to peer if it is already waiting."""
+    server.clients[socket].state = state
+
+    if _logger.isEnabledFor(logging.DEBUG):
+        _logger.debug(
+            "Trainer %s, id %d (%s) -> Finding %d",
+            state.name,
+            public_id(state.id),
+            hex(state.id),
+            state.peer_id,
+        )
+
+    # Is the peer already waiting?
+    other_socket = server.find_peer(state)
+    if other_socket is None:
+        server.start_finding(socket, state)
+    else:
+        server.connect(socket, other_socket)
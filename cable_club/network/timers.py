@@ -0,0 +1,77 @@
+"""Run callbacks after a delay, integrated on the server's loop."""
+
+from __future__ import annotations
+
+import heapq
+import time
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+class Cancellable(Protocol):
+    """Anything that can be cancelled, eg: :py:class:`Timer` or asyncio's handles."""
+
+    def cancel(self) -> None:
+        """Prevent the callback from running."""
+
+
+class Timer:
+    """A callback to be run at some point in time."""
+
+    __slots__ = ("callback", "cancelled", "deadline")
+
+    def __init__(self, deadline: float, callback: Callable[[], object]) -> None:
+        """Initialize an instance."""
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def __lt__(self, other: Timer) -> bool:
+        """Sort timers by deadline."""
+        return self.deadline < other.deadline
+
+    def cancel(self) -> None:
+        """Prevent the callback from running."""
+        self.cancelled = True
+
+
+class Timers:
+    """Heap of timers, sorted by deadline.
+
+    Cancelled timers are not removed right away (that would be O(n)), but skipped
+    once they reach the top of the heap.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an instance."""
+        self.heap: list[Timer] = []
+
+    def __len__(self) -> int:
+        """Amount of timers on the heap, including cancelled ones."""
+        return len(self.heap)
+
+    def call_later(self, delay: float, callback: Callable[[], object]) -> Timer:
+        """Schedule a callback to be run after some seconds."""
+        timer = Timer(time.monotonic() + delay, callback)
+        heapq.heappush(self.heap, timer)
+        return timer
+
+    def timeout(self) -> float | None:
+        """Seconds until next deadline, None if there's nothing scheduled."""
+        while self.heap and self.heap[0].cancelled:
+            heapq.heappop(self.heap)
+
+        if not self.heap:
+            return None
+
+        return max(0.0, self.heap[0].deadline - time.monotonic())
+
+    def run(self) -> None:
+        """Run the callbacks whose deadline has passed."""
+        now = time.monotonic()
+        while self.heap and self.heap[0].deadline <= now:
+            timer = heapq.heappop(self.heap)
+            if not timer.cancelled:
+                timer.callback()
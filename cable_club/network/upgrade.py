@@ -0,0 +1,353 @@
+"""Restart the server (eg: to deploy changes) without dropping the players.
+
+A running server listens on a Unix socket (HANDOFF_SOCKET). A new process, when
+started, connects to it and takes everything over. Sockets are passed with
+SCM_RIGHTS, using the same messages as :py:mod:`.cluster`:
+
+* new -> old
+
+  * ``upgrade,<host>,<port>``: please hand everything over, if listening there
+
+* old -> new
+
+  * ``refused,<reason>``: not handing anything over, new process exits
+  * ``listener`` + fd: the listening socket, new process starts accepting right away
+  * ``client,<key>,<peer's key>`` + payload + fd: a player, along with the bytes
+    received but not processed yet. Peer's key is -1 unless connected
+  * ``done``: nothing left, old process exits
+
+Once asked, the old process stops reading from its clients, and hands them over as
+soon as they are idle: nothing left to be sent, nor being validated. Connected
+players are handed over in pairs, waiting ones will send their ``find`` message
+again, as if they had just connected.
+
+Both ends only talk to processes of the same user, and the socket is only
+accessible by that user.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import selectors
+import socket as s
+import struct
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+from cable_club import exceptions
+
+from .cluster import recv, send
+from .server import Server
+from .states import Connected, Finding, Validating
+
+if TYPE_CHECKING:
+    from cable_club.config import Config
+
+    from .client import Client
+
+
+_logger = logging.getLogger(__name__)
+
+UCRED = struct.Struct("3i")
+"""Layout of ``struct ucred`` (pid, uid, gid), returned by SO_PEERCRED."""
+
+
+def address(config: Config) -> tuple[str, int]:
+    """Get the address that a server with the given config listens on."""
+    return s.gethostbyname(config.host), config.port
+
+
+def trusted(channel: s.socket) -> bool:
+    """Whether the other end of a channel runs as the same user as us.
+
+    Where the peer's credentials are not available, the socket's permissions are
+    relied on instead.
+    """
+    if not hasattr(s, "SO_PEERCRED"):
+        return True
+
+    creds = channel.getsockopt(s.SOL_SOCKET, s.SO_PEERCRED, UCRED.size)
+    _, uid, _ = UCRED.unpack(creds)
+    return cast(int, uid) == os.getuid()
+
+
+class UpgradableServer(Server):
+    """Server that can hand its sockets over to a newer process."""
+
+    def __init__(self, config: Config) -> None:
+        """Initialize an instance."""
+        super().__init__(config)
+
+        self.upgrades: s.socket | None = None
+        """Where newer processes connect to."""
+        self.successor: s.socket | None = None
+        """Connection to the newer process, while handing sockets over."""
+        self.predecessor: s.socket | None = None
+        """Connection to the older process, while taking sockets over."""
+        self.unpaired: dict[int, tuple[s.socket, bytes]] = {}
+        """Connected players that got here before their peer, by old process' key."""
+
+    def listen(self) -> None:
+        """Take the listening socket over from an older process, or open it."""
+        path = self.config.handoff_socket
+        if not path:
+            super().listen()
+            return
+
+        if self.take_over(path):
+            self.selector.register(self.socket, selectors.EVENT_READ)
+            self.schedule_rules_reload()
+            return
+
+        super().listen()
+        self.listen_upgrades(path)
+
+    def listen_upgrades(self, path: str) -> None:
+        """Start accepting connections from newer processes."""
+        # leftover of a previous process
+        Path(path).unlink(missing_ok=True)
+
+        self.upgrades = s.socket(s.AF_UNIX, s.SOCK_SEQPACKET)
+        self.upgrades.bind(path)
+        Path(path).chmod(0o600)
+        self.upgrades.listen()
+        self.selector.register(self.upgrades, selectors.EVENT_READ)
+
+    def take_over(self, path: str) -> bool:
+        """Ask the process listening on the path for its sockets, if any."""
+        channel = s.socket(s.AF_UNIX, s.SOCK_SEQPACKET)
+        try:
+            channel.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            channel.close()
+            return False
+
+        if not trusted(channel):
+            channel.close()
+            msg = f"Process listening on {path} belongs to another user."
+            raise RuntimeError(msg)
+
+        host, port = address(self.config)
+        send(channel, "upgrade", host, port)
+        reader, _, fds = recv(channel)
+        command = None if reader is None else reader.consume()
+        if reader is not None and command == "refused":
+            channel.close()
+            msg = f"Previous process refused to hand over: {reader.consume()}"
+            raise RuntimeError(msg)
+
+        if command != "listener":
+            channel.close()
+            msg = "Previous process did not hand its listening socket over."
+            raise RuntimeError(msg)
+
+        listener = s.socket(fileno=fds[0])
+        if listener.getsockname()[:2] != (host, port):
+            listener.close()
+            channel.close()
+            msg = f"Inherited a listener on {listener.getsockname()}, not {host}:{port}"
+            raise RuntimeError(msg)
+
+        self.socket = listener
+        self.socket.setblocking(False)  # noqa: FBT003
+
+        self.predecessor = channel
+        self.selector.register(channel, selectors.EVENT_READ)
+        _logger.info("Taking over from previous process")
+        return True
+
+    def tick(self) -> None:
+        """Run a single iteration of the loop, and hand idle clients over."""
+        super().tick()
+
+        if self.successor is not None:
+            self.hand_over_clients()
+
+    def handle_events(self, socket: s.socket, events: int) -> None:
+        """Handle a socket that is ready, including the ones between processes."""
+        if socket is self.upgrades:
+            self.hand_over()
+            return
+
+        if socket is self.predecessor:
+            self.handle_predecessor()
+            return
+
+        super().handle_events(socket, events)
+
+    def hand_over(self) -> None:
+        """Give the listening socket to a newer process, then stop reading."""
+        upgrades = cast(s.socket, self.upgrades)
+        channel, _ = upgrades.accept()
+        if not trusted(channel):
+            _logger.error("Process of another user asked for an upgrade")
+            channel.close()
+            return
+
+        reader, _, _ = recv(channel)
+        if reader is None or reader.consume() != "upgrade":
+            _logger.error("Unexpected message on the upgrade socket")
+            channel.close()
+            return
+
+        wanted: tuple[str, int] | None = None
+        with contextlib.suppress(exceptions.ExhaustedReaderError, ValueError):
+            wanted = (reader.consume(), reader.consume_int())
+
+        if wanted is None:
+            _logger.error("Newer process did not say where it listens")
+            channel.close()
+            return
+
+        # another server, sharing the folder rather than replacing this one
+        if wanted != self.socket.getsockname()[:2]:
+            _logger.error("Newer process listens on %s:%d, not upgrading", *wanted)
+            send(channel, "refused", "listening on another address")
+            channel.close()
+            return
+
+        _logger.info("Handing over to newer process")
+
+        # the newer process takes the path over
+        self.selector.unregister(upgrades)
+        upgrades.close()
+        self.upgrades = None
+
+        send(channel, "listener", fd=self.socket.fileno())
+        self.selector.unregister(self.socket)
+        self.socket.close()
+        self.close_metrics()
+        self.successor = channel
+
+        # messages that are already buffered will be processed by the newer process
+        self.reading = False
+        for socket in self.clients:
+            self.watch(socket)
+
+    def idle(self, socket: s.socket, client: Client) -> bool:
+        """Whether a client can be handed over."""
+        if isinstance(client.state, Validating) or client.send_buffer:
+            return False
+
+        pipe = self.pipes.get(socket)
+        return pipe is None or not pipe.pending
+
+    def hand_over_clients(self) -> None:
+        """Send the idle clients to the newer process, and stop once none is left."""
+        channel = cast(s.socket, self.successor)
+
+        for socket, client in list(self.clients.items()):
+            # handed over alongside its peer
+            if socket not in self.clients or not self.idle(socket, client):
+                continue
+
+            if not isinstance(client.state, Connected):
+                self.hand_over_client(socket)
+                continue
+
+            peer = client.state.peer
+            peer_client = self.clients.get(peer)
+            if peer_client is None:
+                self.disconnect(socket, "peer disconnected")
+            elif self.idle(peer, peer_client):
+                # keys are taken before the sockets get closed
+                key, peer_key = socket.fileno(), peer.fileno()
+                self.hand_over_client(socket, peer_key)
+                self.hand_over_client(peer, key)
+
+        if not self.clients:
+            send(channel, "done")
+            channel.close()
+            self.successor = None
+            self.running = False
+            _logger.info("Handed everything over, exiting")
+
+    def hand_over_client(self, socket: s.socket, peer_key: int = -1) -> None:
+        """Send a client to the newer process."""
+        client = self.clients.pop(socket)
+        if client.timer is not None:
+            client.timer.cancel()
+        self.admission.disconnected(client.address[0])
+
+        pipe = self.pipes.pop(socket, None)
+        if pipe is not None:
+            pipe.close()
+
+        payload = bytes(client.recv_buffer)
+        if isinstance(client.state, Finding):
+            self.stop_finding(socket, client.state)
+            payload = client.state.encode(self.config.game_version) + payload
+
+        self.set_events(socket, 0)
+        send(
+            cast(s.socket, self.successor),
+            "client",
+            socket.fileno(),
+            peer_key,
+            payload=payload,
+            fd=socket.fileno(),
+        )
+        socket.close()
+        _logger.debug("%s: handed over", client)
+
+    def handle_predecessor(self) -> None:
+        """Process a message sent by the older process."""
+        channel = cast(s.socket, self.predecessor)
+        reader, payload, fds = recv(channel)
+        if reader is None:
+            _logger.error("Previous process quit before handing everything over")
+            self.finish_take_over()
+            return
+
+        command = reader.consume()
+        if command == "client":
+            key, peer_key = reader.consume_int(), reader.consume_int()
+            socket = s.socket(fileno=fds[0])
+            socket.setblocking(False)  # noqa: FBT003
+            self.adopt(socket, payload, key, peer_key)
+        elif command == "done":
+            self.finish_take_over()
+        else:
+            _logger.error("Unknown command from previous process: %s", command)
+
+    def adopt(self, socket: s.socket, payload: bytes, key: int, peer_key: int) -> None:
+        """Start handling a socket coming from the older process."""
+        if peer_key == -1:
+            self.set_events(socket, selectors.EVENT_READ)
+            self.add_client(socket, socket.getpeername())
+            self.receive(socket, payload)
+            return
+
+        if peer_key not in self.unpaired:
+            self.unpaired[key] = (socket, payload)
+            return
+
+        peer, peer_payload = self.unpaired.pop(peer_key)
+        pair = ((socket, payload, peer), (peer, peer_payload, socket))
+        for sock, data, other in pair:
+            client = self.add_client(sock, sock.getpeername())
+            client.state = Connected(other)
+            client.recv_buffer += data
+            self.set_timeout(sock, client)
+            self.set_events(sock, selectors.EVENT_READ)
+
+        self.pair_up(socket, peer)
+        _logger.info("%s: connected to %s", self.clients[socket], self.clients[peer])
+
+    def finish_take_over(self) -> None:
+        """Stop talking to the older process, and wait for newer ones."""
+        channel = cast(s.socket, self.predecessor)
+        self.selector.unregister(channel)
+        channel.close()
+        self.predecessor = None
+
+        for socket, _ in self.unpaired.values():
+            socket.close()
+        self.unpaired.clear()
+
+        _logger.info("Took over from previous process")
+        self.listen_upgrades(self.config.handoff_socket)
+        # port got released by the older process
+        self.listen_metrics()
@@ -0,0 +1,145 @@
+"""Profile the server while it runs, on demand (eg: ``kill -USR1 <pid>``).
+
+Results are written to the log folder, once the configured duration elapses:
+
+* ``cprofile``: deterministic, every call gets measured. Dumped as a pstats file,
+  read it with :py:mod:`pstats` or tools like snakeviz
+* ``sampling``: a thread looks at the server's stack every few milliseconds, much
+  lower overhead. Dumped in collapsed format, as used by flamegraph.pl/speedscope
+"""
+
+from __future__ import annotations
+
+import collections
+import cProfile
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from . import exceptions
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from types import FrameType
+
+    from .config import Config
+
+
+SAMPLE_INTERVAL = 0.005
+"""Seconds between samples."""
+
+_logger = logging.getLogger(__name__)
+
+
+def collapse(frame: FrameType | None) -> str:
+    """Represent a stack as a single line, outermost call first."""
+    calls = []
+    while frame is not None:
+        code = frame.f_code
+        calls.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(calls))
+
+
+class Sampler:
+    """Take samples of a thread's stack, from another thread."""
+
+    def __init__(self, thread_id: int) -> None:
+        """Initialize an instance."""
+        self.thread_id = thread_id
+        self.samples: collections.Counter[str] = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        """Start taking samples."""
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop taking samples."""
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        """Take samples until stopped."""
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            # the thread being sampled may have exited
+            frame = sys._current_frames().get(self.thread_id)  # noqa: SLF001
+            if frame is not None:
+                self.samples[collapse(frame)] += 1
+
+    def dump(self, path: Path) -> None:
+        """Write the samples, in collapsed format."""
+        with path.open("w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """Profile the thread that starts it, for a while."""
+
+    MODES = ("cprofile", "sampling")
+
+    def __init__(
+        self,
+        config: Config,
+        call_later: Callable[[float, Callable[[], object]], object],
+    ) -> None:
+        """Initialize an instance.
+
+        ``call_later`` schedules the end of the profiling window on the server's
+        loop, where it started. cProfile must be stopped on the same thread.
+        """
+        if config.profiler not in self.MODES:
+            options = ", ".join(self.MODES)
+            msg = f"Unknown profiler '{config.profiler}' (use one of: {options})"
+            raise exceptions.BadConfigurationError(msg)
+
+        self.config = config
+        self.call_later = call_later
+        self.profile: cProfile.Profile | None = None
+        self.sampler: Sampler | None = None
+
+    @property
+    def running(self) -> bool:
+        """Whether a profiling window is open."""
+        return self.profile is not None or self.sampler is not None
+
+    def start(self) -> None:
+        """Start profiling, results get dumped after the configured duration."""
+        if self.running:
+            _logger.warning("Profiler is already running")
+            return
+
+        if self.config.profiler == "cprofile":
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            self.sampler = Sampler(threading.get_ident())
+            self.sampler.start()
+
+        duration = self.config.profile_duration
+        self.call_later(duration, self.stop)
+        _logger.info("Profiling (%s) for %.1fs", self.config.profiler, duration)
+
+    def stop(self) -> None:
+        """Stop profiling, and dump the results."""
+        name = time.strftime("profile-%Y%m%d-%H%M%S")
+
+        if self.profile is not None:
+            self.profile.disable()
+            path = self.config.log_dir / f"{name}.pstats"
+            self.profile.dump_stats(path)
+            self.profile = None
+        elif self.sampler is not None:
+            self.sampler.stop()
+            path = self.config.log_dir / f"{name}.collapsed"
+            self.sampler.dump(path)
+            self.sampler = None
+        else:
+            return
+
+        _logger.info("Profile written to %s", path)
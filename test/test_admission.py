@@ -0,0 +1,62 @@
+"""Test the checks on incoming connections."""
+
+import unittest
+from unittest import mock
+
+from cable_club.network import admission as admission_module
+from cable_club.network.admission import Admission, TokenBucket, has_valid_prefix
+from test import utils as test_utils
+
+
+class AdmissionTest(unittest.TestCase):
+    """Test case for the per-IP limits."""
+
+    def test_token_bucket(self) -> None:
+        """Bursts are allowed, then tokens come back over time."""
+        bucket = TokenBucket(rate=2, burst=3)
+        now = bucket.updated_at
+
+        self.assertEqual([True] * 3 + [False], [bucket.take(now) for _ in range(4)])
+        self.assertTrue(bucket.take(now + 0.5))
+        self.assertFalse(bucket.take(now + 0.5))
+        self.assertTrue(bucket.full(now + 10))
+
+    def test_admit(self) -> None:
+        """Rejections are counted by reason."""
+        admission = Admission(
+            test_utils.server_config(
+                CONNECTION_RATE=1.0,
+                CONNECTION_BURST=2,
+                MAX_CONNECTIONS_PER_IP=1,
+            ),
+        )
+
+        self.assertIsNone(admission.admit("1.2.3.4"))
+        admission.connected("1.2.3.4")
+        self.assertEqual("too many connections", admission.admit("1.2.3.4"))
+
+        admission.disconnected("1.2.3.4")
+        self.assertIsNone(admission.admit("1.2.3.4"))
+        self.assertEqual("connecting too often", admission.admit("1.2.3.4"))
+
+        # other IPs are not affected
+        self.assertIsNone(admission.admit("5.6.7.8"))
+        self.assertEqual(2, admission.rejected.total())
+
+    def test_max_buckets(self) -> None:
+        """Least recently seen IPs are forgotten, once too many are tracked."""
+        admission = Admission(test_utils.server_config(CONNECTION_RATE=1.0))
+
+        with mock.patch.object(admission_module, "MAX_BUCKETS", 3):
+            for host in ("1.1.1.1", "2.2.2.2", "3.3.3.3", "1.1.1.1", "4.4.4.4"):
+                self.assertIsNone(admission.admit(host))
+
+        self.assertEqual(["3.3.3.3", "1.1.1.1", "4.4.4.4"], list(admission.buckets))
+
+    def test_prefix(self) -> None:
+        """Partial data is accepted as long as it could become a find message."""
+        for data in (b"", b"fi", b"find,", b"find,1.0.0"):
+            self.assertTrue(has_valid_prefix(data), data)
+
+        for data in (b"GET / HTTP/1.1", b"\x16\x03\x01", b"find\n"):
+            self.assertFalse(has_valid_prefix(data), data)
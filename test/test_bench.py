@@ -0,0 +1,45 @@
+"""Smoke tests for the benchmarks."""
+
+import unittest
+from typing import cast
+
+from bench import loadgen, micro
+
+
+class LoadgenTest(unittest.TestCase):
+    """Test case for the load generator."""
+
+    def test_run(self) -> None:
+        """A few pairs get matched, and relay messages, on a local server."""
+        args = loadgen.parse_args(["--pairs", "3", "--rate", "20", "--duration", "0.2"])
+        report = loadgen.run(args)
+
+        self.assertEqual(3, report["matched"])
+        self.assertEqual(0, report["errors"])
+
+        handshakes = report["handshake_ms"]
+        if not isinstance(handshakes, dict) or "p50" not in handshakes:
+            msg = "Handshake latencies were not reported"
+            raise AssertionError(msg)
+
+        for key in ("relayed_messages_per_second", "server_cpu_seconds"):
+            value = report[key]
+            if not isinstance(value, float) or value <= 0:
+                msg = f"Unexpected {key}: {value}"
+                raise AssertionError(msg)
+
+
+class MicroTest(unittest.TestCase):
+    """Test case for the microbenchmarks."""
+
+    def test_run(self) -> None:
+        """Filtered cases get timed."""
+        args = micro.parse_args(["--filter", "reader.new", "--min-time", "0.001"])
+        output = micro.run(args)
+
+        results = cast(dict[str, dict[str, float]], output["results"])
+
+        self.assertEqual({"reader.new", "reader.new[escaped]"}, set(results))
+        for result in results.values():
+            self.assertGreater(result["min_ns"], 0)
+            self.assertLessEqual(result["min_ns"], result["median_ns"])
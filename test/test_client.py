@@ -0,0 +1,44 @@
+"""Test the client's buffers."""
+
+import socket
+import unittest
+from unittest import mock
+
+from cable_club.network import client
+from cable_club.network.client import SendQueue
+
+
+class SendQueueTest(unittest.TestCase):
+    """Test case for the outgoing queue of chunks."""
+
+    def test_advance(self) -> None:
+        """Partial sends keep the remaining data in order."""
+        queue = SendQueue()
+        for chunk in (b"abc", b"", b"defg", b"h"):
+            queue.append(chunk)
+
+        queue.advance(2)
+        self.assertEqual(6, len(queue))
+
+        queue.advance(3)
+        self.assertEqual([b"fg", b"h"], queue.pop_all())
+        self.assertEqual(0, len(queue))
+
+    def test_send(self) -> None:
+        """All chunks go out on a single call."""
+        left, right = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+
+        queue = SendQueue()
+        queue.append(b"found,0\n")
+        queue.append(b"choose,1\n")
+
+        self.assertEqual(17, queue.send(left))
+        self.assertEqual(b"found,0\nchoose,1\n", right.recv(4096))
+        self.assertFalse(queue)
+
+    def test_send_without_sendmsg(self) -> None:
+        """Chunks are joined where scatter/gather I/O is not available."""
+        with mock.patch.object(client, "SENDMSG", False):  # noqa: FBT003
+            self.test_send()
@@ -0,0 +1,99 @@
+"""Test the routing of trainers among worker processes."""
+
+import os
+import signal
+import socket
+import unittest
+from unittest import mock
+
+from cable_club.network import cluster
+from test import utils as test_utils
+
+
+class CoordinatorTest(unittest.TestCase):
+    """Test case for the coordinator, with fake workers instead of processes."""
+
+    def setUp(self) -> None:
+        """Attach two workers to a coordinator."""
+        config = test_utils.TestConfig(SERVER_BACKEND="sync")
+        self.coordinator = cluster.Coordinator(config)
+
+        self.workers: list[socket.socket] = []
+        for _ in range(2):
+            parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            self.coordinator.add_channel(parent)
+            self.workers.append(child)
+            self.addCleanup(parent.close)
+            self.addCleanup(child.close)
+
+    def message(self, index: int, *fields: object) -> None:
+        """Make a worker send a message to the coordinator, and process it."""
+        cluster.send(self.workers[index], *fields)
+        self.coordinator.handle(index)
+
+    def test_move_to_peer(self) -> None:
+        """Newcomer gets moved to the worker where its peer is waiting."""
+        self.message(0, "wait", 1, 2)
+        self.message(1, "wait", 2, 1)
+
+        reader, _, _ = cluster.recv(self.workers[1])
+        if reader is None:
+            msg = "Worker's channel got closed???"
+            raise AssertionError(msg)
+
+        self.assertEqual(["move", "2", "1", "0"], reader.raw_all())
+
+    def test_gone(self) -> None:
+        """Trainers that stop waiting are not tracked anymore."""
+        self.message(0, "wait", 1, 2)
+        self.message(0, "gone", 1, 2)
+
+        self.assertEqual({}, self.coordinator.finding)
+
+    def test_lost_worker(self) -> None:
+        """Lost workers are killed, forgotten, and replaced by a new process."""
+        self.message(0, "wait", 1, 2)
+        self.message(1, "wait", 3, 4)
+
+        pid = 12345
+        self.coordinator.pids[0] = pid
+        self.coordinator.started_at[0] = 0.0
+        self.workers[0].close()
+        with (
+            mock.patch("os.kill") as kill,
+            mock.patch("os.waitpid", return_value=(pid, 0)) as waitpid,
+            mock.patch.object(self.coordinator, "spawn") as spawn,
+        ):
+            self.coordinator.handle(0)
+
+        kill.assert_called_once_with(pid, signal.SIGKILL)
+        waitpid.assert_called_once_with(pid, os.WNOHANG)
+        spawn.assert_called_once_with(0)
+        self.assertEqual({(3, 4): [1]}, self.coordinator.finding)
+        self.assertEqual([1], list(self.coordinator.channels))
+        self.assertEqual(set(), self.coordinator.exited)
+
+
+class WorkerTest(unittest.TestCase):
+    """Test case for the servers running on each worker process."""
+
+    def test_metrics(self) -> None:
+        """Every worker serves its metrics on a port of its own."""
+        port = test_utils.free_port()
+        config = test_utils.server_config(WORKERS=2, METRICS_PORT=port)
+
+        ports = []
+        for index in range(2):
+            parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            self.addCleanup(parent.close)
+            self.addCleanup(child.close)
+
+            worker = cluster.Worker(config, index, child)
+            worker.listen_metrics()
+            self.addCleanup(worker.shutdown)
+            if worker.metrics_socket is None:
+                msg = "Metrics are not being served???"
+                raise AssertionError(msg)
+            ports.append(worker.metrics_socket.getsockname()[1])
+
+        self.assertEqual([port, port + 1], ports)
@@ -0,0 +1,70 @@
+"""Test the logging pipeline."""
+
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+
+from cable_club import constants, logs
+from test import utils as test_utils
+
+
+def record(msg: str, level: int = logging.DEBUG) -> logging.LogRecord:
+    """Create a record, as logged from some call site."""
+    return logging.LogRecord("test", level, __file__, 1, msg, (), None)
+
+
+class RateLimitTest(unittest.TestCase):
+    """Test case for RateLimit."""
+
+    def test_filter(self) -> None:
+        """Each call site gets its own budget, drops are reported."""
+        limit = logs.RateLimit(2)
+
+        passed = [limit.filter(record("sent %d bytes")) for _ in range(5)]
+        self.assertEqual([True, True, False, False, False], passed)
+
+        # other call sites, and higher levels, are not affected
+        self.assertTrue(limit.filter(record("received: %s")))
+        self.assertTrue(limit.filter(record("sent %d bytes", logging.INFO)))
+
+        limit.buckets["sent %d bytes"].tokens = 1
+        resumed = record("sent %d bytes")
+        self.assertTrue(limit.filter(resumed))
+        self.assertEqual("sent %d bytes (3 similar messages dropped)", resumed.msg)
+
+
+class SetupTest(unittest.TestCase):
+    """Test case for the queue-based setup."""
+
+    def setUp(self) -> None:
+        """Restore the root logger once done."""
+        root = logging.getLogger()
+        handlers, level = root.handlers[:], root.level
+
+        def restore() -> None:
+            for handler in root.handlers[:]:
+                if handler not in handlers:
+                    root.removeHandler(handler)
+                    handler.close()
+            root.setLevel(level)
+
+        self.addCleanup(restore)
+
+    def test_setup(self) -> None:
+        """Records reach the file once the listener gets stopped."""
+        with tempfile.TemporaryDirectory() as tmp:
+            config = test_utils.server_config(LOG_DIR=Path(tmp), LOG_LEVEL="INFO")
+            logs.setup(config)
+
+            logging.getLogger("cable_club.test").info("hello from the loop")
+            logging.getLogger("cable_club.test").debug("below the level")
+            logs.stop()
+
+            # written directly from now on
+            logging.getLogger("cable_club.test").warning("while exiting")
+
+            text = (Path(tmp) / constants.LOG_FILE).read_text()
+            self.assertIn("hello from the loop", text)
+            self.assertIn("while exiting", text)
+            self.assertNotIn("below the level", text)
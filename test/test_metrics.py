@@ -0,0 +1,36 @@
+"""Test the metrics' report."""
+
+import unittest
+
+from cable_club.network.metrics import Histogram, disconnect_reason
+
+
+class HistogramTest(unittest.TestCase):
+    """Test case for the histograms."""
+
+    def test_render(self) -> None:
+        """Buckets are cumulative, and bounds are inclusive."""
+        histogram = Histogram("test", "Some help.", (1.0, 2.0))
+        for value in (0.5, 1.0, 1.5, 3.0):
+            histogram.observe(value)
+
+        expected = [
+            "# HELP test Some help.",
+            "# TYPE test histogram",
+            'test_bucket{le="1.0"} 2',
+            'test_bucket{le="2.0"} 3',
+            'test_bucket{le="+Inf"} 4',
+            "test_sum 6.0",
+            "test_count 4",
+        ]
+        self.assertEqual(expected, histogram.render())
+
+
+class DisconnectReasonTest(unittest.TestCase):
+    """Test case for the labels of disconnections."""
+
+    def test_labels(self) -> None:
+        """Known reasons get their label, anything else is an error."""
+        self.assertEqual("timeout", disconnect_reason("timed out"))
+        self.assertEqual("invalid party", disconnect_reason("invalid content"))
+        self.assertEqual("error", disconnect_reason("[Errno 104] Connection reset"))
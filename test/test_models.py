@@ -1,6 +1,9 @@
 """Test data models."""
 
+import itertools
+import random
 import unittest
+from unittest import mock
 
 from cable_club import utils as cc_utils
 from cable_club.data import models
@@ -61,3 +64,59 @@ class ModelTest(unittest.TestCase):
             party = models.Party.read_from(reader)
 
         self.assertEqual(6, party.n_pokemon)
+
+
+FLAGS = ("PLA_INSTALLED", "MUI_MEMENTOS_INSTALLED", "FOCUS_INSTALLED")
+"""Optional features not on the fixture, its party is invalid with them."""
+
+VALUES = ("", "0", "1", "-1", "3", "6", "999", "4294967297", "true", "false", "x" * 20)
+"""Replacements for the fields of the fixture."""
+
+
+class CompiledTest(unittest.TestCase):
+    """Test case for the parsers generated by configure()."""
+
+    def tearDown(self) -> None:
+        """Go back to the configuration used by other tests."""
+        with cc_utils.disable_warnings():
+            models.configure(test_utils.server_config())
+
+    @staticmethod
+    def parse(raw: list[str]) -> tuple[str, str, int]:
+        """Parse a party, return its representation (or the error) and what's left."""
+        reader = Reader.new(",".join(raw).encode())
+        if reader is None:
+            msg = "Invalid reader from fixture???"
+            raise AssertionError(msg)
+
+        try:
+            result = repr(models.Party.read_from(reader))
+        except Exception as e:  # noqa: BLE001
+            return type(e).__name__, str(e), reader.cursor
+        return "ok", result, reader.cursor
+
+    def test_differential(self) -> None:
+        """Generated parsers get the same results as the fields' validation."""
+        reader = ModelTest.reader_factory()
+        party = reader.raw_all()
+        rng = random.Random(0)  # noqa: S311
+
+        for flags in itertools.product((False, True), repeat=len(FLAGS)):
+            config = test_utils.server_config(**dict(zip(FLAGS, flags, strict=True)))
+            with cc_utils.disable_warnings():
+                models.configure(config)
+            self.assertTrue(models.parsers)
+
+            for i in range(200):
+                raw = party[:]
+                # first one is the fixture as-is
+                for _ in range(min(i, 2)):
+                    raw[rng.randrange(len(raw))] = rng.choice(VALUES)
+
+                compiled = self.parse(raw)
+                with mock.patch.dict(models.parsers, clear=True):
+                    reference = self.parse(raw)
+                self.assertEqual(reference, compiled, (flags, raw))
+
+            if not any(flags):
+                self.assertEqual("ok", self.parse(party)[0])
@@ -0,0 +1,87 @@
+"""Test the on-demand profiler."""
+
+import pstats
+import tempfile
+import time
+import unittest
+from collections.abc import Callable
+from pathlib import Path
+
+from cable_club import exceptions
+from cable_club.profiler import Profiler
+from test import utils as test_utils
+
+
+def busy(seconds: float) -> None:
+    """Keep the thread doing something, for a while."""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+class ProfilerTest(unittest.TestCase):
+    """Test case for Profiler."""
+
+    def setUp(self) -> None:
+        """Write the results to a temporary folder."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.log_dir = Path(tmp.name)
+        self.scheduled: list[tuple[float, Callable[[], object]]] = []
+
+    def call_later(self, delay: float, callback: Callable[[], object]) -> None:
+        """Record what the profiler schedules, instead of running a loop."""
+        self.scheduled.append((delay, callback))
+
+    def profile(self, mode: str) -> Path:
+        """Run a profiling window, and return the file written."""
+        config = test_utils.server_config(
+            LOG_DIR=self.log_dir,
+            PROFILER=mode,
+            PROFILE_DURATION=5.0,
+        )
+        profiler = Profiler(config, self.call_later)
+
+        profiler.start()
+        profiler.start()  # ignored, already running
+        self.assertTrue(profiler.running)
+        self.assertEqual([5.0], [delay for delay, _ in self.scheduled])
+
+        busy(0.1)
+        _, stop = self.scheduled[0]
+        stop()
+        self.assertFalse(profiler.running)
+
+        files = list(self.log_dir.iterdir())
+        self.assertEqual(1, len(files))
+        return files[0]
+
+    def test_cprofile(self) -> None:
+        """Stats can be loaded with pstats."""
+        path = self.profile("cprofile")
+        self.assertEqual(".pstats", path.suffix)
+
+        stats = pstats.Stats(str(path))
+        functions = {name for _, _, name in stats.stats}  # type: ignore[attr-defined]
+        self.assertIn("busy", functions)
+
+    def test_sampling(self) -> None:
+        """Stacks are collapsed, one per line, with their count."""
+        path = self.profile("sampling")
+        self.assertEqual(".collapsed", path.suffix)
+
+        lines = path.read_text().splitlines()
+        if not lines:
+            msg = "No samples were taken"
+            raise AssertionError(msg)
+
+        for line in lines:
+            _, count = line.rsplit(" ", 1)
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any("busy (test_profiler.py:" in line for line in lines))
+
+    def test_unknown(self) -> None:
+        """Typos on the config are reported."""
+        config = test_utils.server_config(PROFILER="perf")
+        with self.assertRaises(exceptions.BadConfigurationError):
+            Profiler(config, self.call_later)
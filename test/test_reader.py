@@ -0,0 +1,143 @@
+"""Test parsing of incoming messages."""
+
+import random
+import unittest
+
+from cable_club import exceptions
+from cable_club.data.reader import Reader, StreamReader
+from cable_club.data.writer import Writer
+from test import fixtures
+
+ALPHABET = ("a", "b", ",", "\\", "é", " ", "\n")
+"""Characters the fuzzed lines are made of, biased towards the special ones."""
+
+
+def reference(line: str) -> list[str]:
+    """Split a line, as the reader used to (one character at a time)."""
+    fields = []
+    field = ""
+    escape = False
+    for c in line:
+        if c == "," and not escape:
+            fields.append(field)
+            field = ""
+        elif c == "\\" and not escape:
+            escape = True
+        else:
+            field += c
+            escape = False
+    fields.append(field)
+    return fields
+
+
+def chunks(raw: bytes, rng: random.Random) -> list[bytes]:
+    """Cut some data in random places."""
+    cuts = sorted(rng.sample(range(len(raw) + 1), min(len(raw) + 1, 4)))
+    bounds = zip([0, *cuts], [*cuts, len(raw)], strict=True)
+    return [raw[start:end] for start, end in bounds]
+
+
+def split(raw: bytes) -> list[str] | None:
+    """Fields found by the reader, in order."""
+    reader = Reader.new(raw)
+    if reader is None:
+        return None
+    return reader.raw_all()
+
+
+class ReaderTest(unittest.TestCase):
+    """Test case for Reader."""
+
+    def test_split(self) -> None:
+        """Escapes are handled, a dangling one is dropped."""
+        cases = {
+            b"": [""],
+            b"a,b": ["a", "b"],
+            b",,": ["", "", ""],
+            b"a\\,b,c": ["a,b", "c"],
+            b"a\\\\,b": ["a\\", "b"],
+            b"\\a\\": ["a"],
+            b"a,\\": ["a", ""],
+        }
+        for raw, expected in cases.items():
+            self.assertEqual(expected, split(raw), raw)
+
+    def test_consume(self) -> None:
+        """Fields are consumed in order, looking at the rest does not consume them."""
+        reader = Reader.new(b"find,1,true")
+        if reader is None:
+            msg = "Valid input was rejected"
+            raise AssertionError(msg)
+
+        self.assertEqual("find", reader.consume())
+        self.assertEqual(["1", "true"], reader.raw_all())
+        self.assertEqual(1, reader.consume_int())
+        self.assertTrue(reader.consume_bool())
+        self.assertEqual([], reader.raw_all())
+        with self.assertRaises(exceptions.ExhaustedReaderError):
+            reader.consume()
+
+    def test_invalid_utf8(self) -> None:
+        """No reader is created."""
+        self.assertIsNone(Reader.new(b"find,\xff"))
+
+    def test_fixtures(self) -> None:
+        """Real messages are split like they used to."""
+        for raw in (fixtures.VALID, fixtures.VALID.replace(b"Red", b"R\\\\e\\,d")):
+            self.assertEqual(reference(raw.decode()), split(raw))
+
+    def test_fuzz(self) -> None:
+        """Random lines are split like they used to."""
+        rng = random.Random(0)  # noqa: S311
+        for _ in range(5000):
+            line = "".join(rng.choices(ALPHABET, k=rng.randrange(30)))
+            self.assertEqual(reference(line), split(line.encode()), repr(line))
+
+    def test_roundtrip(self) -> None:
+        """Whatever the writer escapes is read back."""
+        rng = random.Random(1)  # noqa: S311
+        for _ in range(1000):
+            fields = [
+                "".join(rng.choices(ALPHABET, k=rng.randrange(5)))
+                for _ in range(rng.randrange(1, 6))
+            ]
+            writer = Writer()
+            for field in fields:
+                writer.add(field)
+
+            # encode appends the line terminator
+            self.assertEqual(fields, split(writer.encode()[:-1]))
+
+
+class StreamReaderTest(unittest.TestCase):
+    """Test case for StreamReader."""
+
+    def test_fuzz(self) -> None:
+        """Lines fed in chunks are split like they were fed at once."""
+        rng = random.Random(2)  # noqa: S311
+        for _ in range(5000):
+            line = "".join(rng.choices(ALPHABET, k=rng.randrange(30))).encode()
+            expected = reference(line.decode())
+
+            reader = StreamReader()
+            *parts, last = chunks(line, rng)
+            for part in parts:
+                self.assertTrue(reader.feed(part))
+                # no field is available before it is complete
+                self.assertEqual(reader.fields, expected[: len(reader.fields)])
+            self.assertTrue(reader.feed(last, last=True))
+
+            self.assertEqual(expected, reader.raw_all(), repr(line))
+
+    def test_split_character(self) -> None:
+        """A character cut in half is decoded once complete."""
+        reader = StreamReader()
+        self.assertTrue(reader.feed("a,é".encode()[:-1]))
+        self.assertTrue(reader.feed("é".encode()[-1:], last=True))
+        self.assertEqual(["a", "é"], reader.raw_all())
+
+    def test_invalid_utf8(self) -> None:
+        """Invalid data is reported once its field is complete."""
+        reader = StreamReader()
+        self.assertTrue(reader.feed(b"find,\xff"))
+        self.assertFalse(reader.feed(b","))
@@ -0,0 +1,632 @@
+"""Test the server's backends."""
+
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import ClassVar, NoReturn
+from unittest import mock
+
+from cable_club.network import aio, server
+from cable_club.network.aio import AsyncServer
+from cable_club.network.server import Server
+from cable_club.network.states import public_id
+from test import utils as test_utils
+
+RED = 1492491670
+BLUE = 0xCAFE
+
+
+def crash(*_: object) -> NoReturn:
+    """Stand-in for the validation, killing the process it runs on."""
+    os._exit(1)
+
+
+class AsyncServerTest(unittest.IsolatedAsyncioTestCase):
+    """Test case for the asyncio backend."""
+
+    settings: ClassVar[dict[str, object]] = {}
+    """Extra configuration for the server."""
+
+    async def asyncSetUp(self) -> None:
+        """Start a server on a random port."""
+        self.server = AsyncServer(test_utils.server_config(**self.settings))
+        self.listener = await self.server.start()
+
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self) -> None:
+        """Stop the server."""
+        self.listener.close()
+        await self.listener.wait_closed()
+        self.server.stop_pool()
+
+    async def test_match_and_relay(self) -> None:
+        """Two trainers looking for each other get connected, then messages flow."""
+        red_r, red_w = await asyncio.open_connection("127.0.0.1", self.port)
+        blue_r, blue_w = await asyncio.open_connection("127.0.0.1", self.port)
+
+        red_w.write(test_utils.find_message(peer_id=BLUE, id_=RED))
+        blue_w.write(test_utils.find_message(peer_id=public_id(RED), id_=BLUE))
+
+        for reader in (red_r, blue_r):
+            line = await asyncio.wait_for(reader.readline(), 5)
+            self.assertTrue(line.startswith(b"found,"))
+
+        red_w.write(b"choose,1\n")
+        line = await asyncio.wait_for(blue_r.readline(), 5)
+        self.assertEqual(b"choose,1\n", line)
+
+        for writer in (red_w, blue_w):
+            writer.close()
+
+    async def test_disconnect_slow_reader(self) -> None:
+        """Closing a client that does not read does not last forever."""
+        red_r, red_w = await asyncio.open_connection("127.0.0.1", self.port)
+        blue_r, blue_w = await asyncio.open_connection("127.0.0.1", self.port)
+        for writer in (red_w, blue_w):
+            self.addCleanup(writer.close)
+
+        red_w.write(test_utils.find_message(peer_id=BLUE, id_=RED))
+        blue_w.write(test_utils.find_message(peer_id=public_id(RED), id_=BLUE))
+        for reader in (red_r, blue_r):
+            await asyncio.wait_for(reader.readline(), 5)
+
+        # way more than what fits on the kernel's buffers
+        sock, client = next(iter(self.server.clients.items()))
+        client.send_buffer.append(b"x" * (1 << 24))
+
+        lost = asyncio.Event()
+        protocol = self.server.transports[sock].get_protocol()
+        connection_lost = protocol.connection_lost
+
+        def spy(exc: Exception | None) -> None:
+            connection_lost(exc)
+            lost.set()
+
+        with (
+            mock.patch.object(aio, "CLOSE_TIMEOUT", 0.1),
+            mock.patch.object(protocol, "connection_lost", spy),
+        ):
+            self.server.disconnect(sock, "bye")
+            await asyncio.wait_for(lost.wait(), 5)
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "no SIGUSR1 on this platform")
+    async def test_signal(self) -> None:
+        """Handlers added before starting get installed on the loop."""
+        received = asyncio.Event()
+        server = AsyncServer(test_utils.server_config())
+        server.add_signal_handler(signal.SIGUSR1, received.set)
+        listener = await server.start()
+        loop = asyncio.get_running_loop()
+        self.addCleanup(loop.remove_signal_handler, signal.SIGUSR1)
+        self.addCleanup(listener.close)
+
+        os.kill(os.getpid(), signal.SIGUSR1)
+        await asyncio.wait_for(received.wait(), 5)
+
+
+class AsyncValidationPoolServerTest(AsyncServerTest):
+    """Same tests, validating parties on another process."""
+
+    settings: ClassVar[dict[str, object]] = {"VALIDATION_WORKERS": 1}
+
+
+class AsyncBackpressureServerTest(AsyncServerTest):
+    """Same tests, with tiny watermarks."""
+
+    settings: ClassVar[dict[str, object]] = {
+        "HIGH_WATERMARK": 1000,
+        "LOW_WATERMARK": 500,
+    }
+
+    async def connect_pair(
+        self,
+    ) -> tuple[
+        tuple[asyncio.StreamReader, asyncio.StreamWriter],
+        tuple[asyncio.StreamReader, asyncio.StreamWriter],
+    ]:
+        """Connect two trainers to each other."""
+        red = await asyncio.open_connection("127.0.0.1", self.port)
+        blue = await asyncio.open_connection("127.0.0.1", self.port)
+        for _, writer in (red, blue):
+            self.addCleanup(writer.close)
+
+        red[1].write(test_utils.find_message(peer_id=BLUE, id_=RED))
+        blue[1].write(test_utils.find_message(peer_id=public_id(RED), id_=BLUE))
+        for reader, _ in (red, blue):
+            await asyncio.wait_for(reader.readline(), 5)
+
+        return red, blue
+
+    async def test_large_message(self) -> None:
+        """A message over the watermark, flushed right away, throttles no one."""
+        (_, red_w), (blue_r, _) = await self.connect_pair()
+
+        big = b"choose," + b"1" * 3000 + b"\n"
+        red_w.write(big)
+        self.assertEqual(big, await asyncio.wait_for(blue_r.readline(), 5))
+
+        red_w.write(b"hello\n")
+        self.assertEqual(b"hello\n", await asyncio.wait_for(blue_r.readline(), 5))
+
+        for client in self.server.clients.values():
+            self.assertIsNone(client.throttled_at)
+
+    async def test_slow_reader(self) -> None:
+        """Stop reading from a client while its peer is behind, then resume."""
+        (_, red_w), (blue_r, _) = await self.connect_pair()
+        red_client = next(iter(self.server.clients.values()))
+
+        # enough data to fill kernel buffers (they can grow to a few MB), while
+        # blue is not reading
+        data = (b"choose," + b"1" * 60000 + b"\n") * 200
+        throttled = asyncio.Event()
+        throttle = self.server.throttle
+
+        def spy(sock: socket.socket) -> None:
+            throttle(sock)
+            throttled.set()
+
+        with mock.patch.object(self.server, "throttle", spy):
+            red_w.write(data)
+            await asyncio.wait_for(throttled.wait(), 10)
+        self.assertIsNotNone(red_client.throttled_at)
+
+        received = await asyncio.wait_for(blue_r.readexactly(len(data)), 10)
+        self.assertEqual(data, received)
+        self.assertIsNone(red_client.throttled_at)
+        self.assertGreater(red_client.throttled_for, 0)
+
+
+class ServerTest(unittest.TestCase):
+    """Test case for the blocking (selectors) backend."""
+
+    settings: ClassVar[dict[str, object]] = {}
+    """Extra configuration for the server."""
+
+    def setUp(self) -> None:
+        """Start a server on a random port."""
+        self.server = Server(test_utils.server_config(**self.settings))
+        self.server.listen()
+
+        self.address = self.server.socket.getsockname()
+
+    def tearDown(self) -> None:
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.socket.close()
+
+    def readline(self, sock: socket.socket) -> bytes:
+        """Run the server until a whole line is available on a client's socket."""
+        buffer = b""
+        while not buffer.endswith(b"\n"):
+            while not select.select([sock], [], [], 0)[0]:
+                self.server.tick()
+            data = sock.recv(4096)
+            if not data:
+                break
+            buffer += data
+        return buffer
+
+    def test_match_and_relay(self) -> None:
+        """Two trainers looking for each other get connected, then messages flow."""
+        red = socket.create_connection(self.address)
+        blue = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+        self.addCleanup(blue.close)
+
+        red.sendall(test_utils.find_message(peer_id=BLUE, id_=RED))
+        blue.sendall(test_utils.find_message(peer_id=public_id(RED), id_=BLUE))
+
+        for sock in (red, blue):
+            self.assertTrue(self.readline(sock).startswith(b"found,"))
+
+        red.sendall(b"choose,1\n")
+        self.assertEqual(b"choose,1\n", self.readline(blue))
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "no SIGUSR1 on this platform")
+    def test_signal(self) -> None:
+        """Signals wake the loop up, and their callbacks run on it."""
+        self.addCleanup(signal.signal, signal.SIGUSR1, signal.getsignal(signal.SIGUSR1))
+        received = []
+        self.server.add_signal_handler(signal.SIGUSR1, lambda: received.append(1))
+
+        # nothing else would wake the loop up for a long while
+        self.server.call_later(60, lambda: None)
+        os.kill(os.getpid(), signal.SIGUSR1)
+        start = time.monotonic()
+        self.server.tick()
+
+        self.assertEqual([1], received)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_finding_index(self) -> None:
+        """Waiting trainers are indexed, and removed from it when they leave."""
+        red = socket.create_connection(self.address)
+        red.sendall(test_utils.find_message(peer_id=BLUE, id_=RED))
+        while not self.server.finding:
+            self.server.tick()
+
+        self.assertEqual([(public_id(RED), BLUE)], list(self.server.finding))
+
+        red.close()
+        while self.server.clients:
+            self.server.tick()
+
+        self.assertEqual({}, self.server.finding)
+
+    def test_message_too_long(self) -> None:
+        """Clients get kicked before they fill the server's memory."""
+        red = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+
+        red.sendall(b"find," + b"x" * self.server.config.max_message_size)
+        self.assertEqual(b"disconnect,message too long\n", self.readline(red))
+
+    def test_not_cable_club(self) -> None:
+        """Other protocols get kicked right away, and counted."""
+        red = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+
+        red.sendall(b"GET / HTTP/1.1\r\n")
+        self.assertEqual(b"disconnect,not a cable_club message\n", self.readline(red))
+        self.assertEqual(1, self.server.admission.rejected["not a cable_club message"])
+        self.assertFalse(self.server.admission.connections)
+
+    def test_partial_invalid_party(self) -> None:
+        """Wrong parties are rejected before the whole message comes in."""
+        red = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+
+        message = test_utils.find_message(peer_id=BLUE, id_=RED)
+        message = message.replace(b",ARIADOS,100,", b",ARIADOS,999,")
+        red.sendall(message[: len(message) // 2])
+        self.assertEqual(b"disconnect,invalid party\n", self.readline(red))
+
+    def test_connection_limits(self) -> None:
+        """Connections over the per-IP limit are closed right after accepting."""
+        limit = self.server.config.max_connections_per_ip
+        socks = [socket.create_connection(self.address) for _ in range(limit + 1)]
+        for sock in socks:
+            self.addCleanup(sock.close)
+
+        # closed without a word
+        self.assertEqual(b"", self.readline(socks[-1]))
+        self.assertEqual(limit, len(self.server.clients))
+
+    def test_disconnect_pair(self) -> None:
+        """Both ends get the reason and EOF, sockets are closed once they hang up."""
+        red = socket.create_connection(self.address)
+        blue = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+        self.addCleanup(blue.close)
+
+        red.sendall(test_utils.find_message(peer_id=BLUE, id_=RED))
+        blue.sendall(test_utils.find_message(peer_id=public_id(RED), id_=BLUE))
+
+        for sock in (red, blue):
+            self.readline(sock)
+
+        red.close()
+        self.assertEqual(b"disconnect,peer disconnected\n", self.readline(blue))
+        self.assertEqual(b"", self.readline(blue))
+        self.assertFalse(self.server.clients)
+
+        blue.close()
+        while self.server.closing:
+            self.server.tick()
+
+    def test_disconnect_slow_reader(self) -> None:
+        """Closing a client that does not read does not block, nor last forever."""
+        red = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+        while not self.server.clients:
+            self.server.tick()
+
+        # way more than what fits on the kernel's buffers
+        sock, client = next(iter(self.server.clients.items()))
+        client.send_buffer.append(b"x" * (1 << 24))
+
+        with mock.patch.object(server, "CLOSE_TIMEOUT", 0.1):
+            self.server.disconnect(sock, "bye")
+            self.server.close_pending()
+            self.assertIn(sock, self.server.closing)
+
+            while self.server.closing:
+                self.server.tick()
+
+        self.assertEqual(-1, sock.fileno())
+
+
+class RawRelayServerTest(ServerTest):
+    """Same tests, forwarding bytes as they come (spliced, on Linux)."""
+
+    settings: ClassVar[dict[str, object]] = {"RAW_RELAY": True}
+
+    def test_partial_messages(self) -> None:
+        """Bytes are forwarded even if they dont form a whole message yet."""
+        red = socket.create_connection(self.address)
+        blue = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+        self.addCleanup(blue.close)
+
+        red.sendall(test_utils.find_message(peer_id=BLUE, id_=RED))
+        blue.sendall(test_utils.find_message(peer_id=public_id(RED), id_=BLUE))
+
+        for sock in (red, blue):
+            self.readline(sock)
+
+        red.sendall(b"cho")
+        red.sendall(b"ose,1\n")
+        self.assertEqual(b"choose,1\n", self.readline(blue))
+
+
+class BackpressureServerTest(ServerTest):
+    """Same tests, with tiny watermarks."""
+
+    settings: ClassVar[dict[str, object]] = {
+        "HIGH_WATERMARK": 1 << 10,
+        "LOW_WATERMARK": 1 << 8,
+    }
+
+    def test_slow_reader(self) -> None:
+        """Stop reading from a client while its peer is behind, then resume."""
+        red = socket.create_connection(self.address)
+        blue = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+        self.addCleanup(blue.close)
+
+        red.sendall(test_utils.find_message(peer_id=BLUE, id_=RED))
+        blue.sendall(test_utils.find_message(peer_id=public_id(RED), id_=BLUE))
+
+        for sock in (red, blue):
+            self.readline(sock)
+
+        # enough data to fill kernel buffers, sent on the background
+        data = b"choose,1\n" * (1 << 17)
+        sender = threading.Thread(target=red.sendall, args=(data,))
+        sender.start()
+
+        red_client = next(iter(self.server.clients.values()))
+        while red_client.throttled_at is None:
+            self.server.tick()
+
+        received = b""
+        while len(received) < len(data):
+            self.server.tick()
+            if select.select([blue], [], [], 0)[0]:
+                received += blue.recv(1 << 16)
+
+        sender.join()
+        self.assertEqual(data, received)
+        self.assertIsNone(red_client.throttled_at)
+        self.assertGreater(red_client.throttled_for, 0)
+
+
+class TimeoutServerTest(ServerTest):
+    """Same tests, with short timeouts."""
+
+    settings: ClassVar[dict[str, object]] = {
+        "CONNECTING_TIMEOUT": 0.2,
+        "IDLE_TIMEOUT": 0.2,
+    }
+
+    def test_connecting_timeout(self) -> None:
+        """Kick a client that does not send its party."""
+        sock = socket.create_connection(self.address)
+        self.addCleanup(sock.close)
+
+        self.assertTrue(self.readline(sock).startswith(b"disconnect,timed out"))
+        self.assertFalse(self.server.clients)
+
+    def test_idle_timeout(self) -> None:
+        """Kick connected clients once they stop talking."""
+        red = socket.create_connection(self.address)
+        blue = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+        self.addCleanup(blue.close)
+
+        red.sendall(test_utils.find_message(peer_id=BLUE, id_=RED))
+        blue.sendall(test_utils.find_message(peer_id=public_id(RED), id_=BLUE))
+
+        for sock in (red, blue):
+            self.readline(sock)
+
+        reasons = {self.readline(sock).split(b",")[1].strip() for sock in (red, blue)}
+        self.assertEqual({b"timed out", b"peer disconnected"}, reasons)
+
+
+class AcceptBudgetServerTest(ServerTest):
+    """Same tests, accepting few connections at once."""
+
+    settings: ClassVar[dict[str, object]] = {"ACCEPT_BUDGET": 4}
+
+    def test_connection_storm(self) -> None:
+        """Pending connections are accepted in batches."""
+        socks = [socket.create_connection(self.address) for _ in range(10)]
+        for sock in socks:
+            self.addCleanup(sock.close)
+
+        if sys.platform == "linux":
+            self.assertEqual(10, self.server.accept_queue_depth())
+
+        while len(self.server.clients) < len(socks):
+            self.server.tick()
+
+        self.assertEqual(3, self.server.accept_batches)
+        self.assertEqual(2, self.server.accept_budget_exhausted)
+        self.assertEqual(4, self.server.largest_accept_batch)
+        self.assertEqual(0, self.server.accept_queue_depth() or 0)
+
+
+class ValidationPoolServerTest(ServerTest):
+    """Same tests, validating parties on another process."""
+
+    settings: ClassVar[dict[str, object]] = {"VALIDATION_WORKERS": 1}
+
+    def test_died_while_idle(self) -> None:
+        """A process that died between parties is replaced, without losing any."""
+        self.test_match_and_relay()
+        pool = self.server.pool
+        if pool is None:
+            msg = "Pool did not start???"
+            raise AssertionError(msg)
+
+        for process in multiprocessing.active_children():
+            process.kill()
+        # wait for the pool to notice
+        with contextlib.suppress(BrokenProcessPool):
+            pool.submit(int).result()
+
+        self.test_match_and_relay()
+        self.assertIsNot(pool, self.server.pool)
+
+    def test_died_while_validating(self) -> None:
+        """A party that crashes the pool is rejected, the next ones are not."""
+        red = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+
+        with mock.patch.object(server, "check_find_compact", crash):
+            red.sendall(test_utils.find_message(peer_id=BLUE, id_=RED))
+            self.assertEqual(b"disconnect,server error\n", self.readline(red))
+
+        self.assertIsNone(self.server.pool)
+        self.test_match_and_relay()
+
+    @unittest.skip("parties are sent to the pool once complete")
+    def test_partial_invalid_party(self) -> None:
+        """Not applicable."""
+
+    def test_invalid_party(self) -> None:
+        """Verdict from the pool gets to the client."""
+        red = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+
+        message = test_utils.find_message(peer_id=BLUE, id_=RED)
+        red.sendall(message.replace(b",ARIADOS,100,", b",ARIADOS,999,"))
+        self.assertEqual(b"disconnect,invalid party\n", self.readline(red))
+
+
+class RulesServerTest(ServerTest):
+    """Same tests, with a rule on the server."""
+
+    def setUp(self) -> None:
+        """Create the rules folder, then start the server."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.rules_dir = Path(tmp.name)
+        self.write_rule("first", "Little Cup")
+
+        self.server = Server(test_utils.server_config(RULES_DIR=self.rules_dir))
+        self.server.listen()
+
+        self.address = self.server.socket.getsockname()
+
+    def write_rule(self, name: str, title: str) -> None:
+        """Add a file to the rules folder."""
+        lines = (title, "1", "5", "SPECIESCLAUSE,ITEMCLAUSE")
+        (self.rules_dir / f"{name}.txt").write_text("\n".join(lines) + "\n")
+
+    def test_reload(self) -> None:
+        """Rules are encoded once, and again only when they change."""
+        red = socket.create_connection(self.address)
+        blue = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+        self.addCleanup(blue.close)
+
+        red.sendall(test_utils.find_message(peer_id=BLUE, id_=RED))
+        blue.sendall(test_utils.find_message(peer_id=public_id(RED), id_=BLUE))
+
+        rules = b",1,Little Cup,1,5,SPECIESCLAUSE,ITEMCLAUSE\n"
+        for sock in (red, blue):
+            self.assertTrue(self.readline(sock).endswith(rules))
+
+        encoded = self.server.rules_encoded
+        self.server.refresh_rules_at = 0
+        self.server.maybe_reload_rules()
+        self.assertIs(encoded, self.server.rules_encoded)
+
+        self.write_rule("second", "Doubles")
+        self.server.refresh_rules_at = 0
+        self.server.maybe_reload_rules()
+        self.assertTrue(self.server.rules_encoded.startswith(b"2,"))
+        self.assertIn(b"Doubles", self.server.rules_encoded)
+
+
+class MetricsServerTest(ServerTest):
+    """Same tests, serving metrics."""
+
+    settings: ClassVar[dict[str, object]] = {"METRICS_PORT": test_utils.free_port()}
+
+    def scrape(self) -> str:
+        """Ask the server for its metrics."""
+        if self.server.metrics_socket is None:
+            msg = "Metrics are not enabled"
+            raise AssertionError(msg)
+
+        sock = socket.create_connection(self.server.metrics_socket.getsockname())
+        with sock:
+            sock.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+            response = b""
+            while True:
+                while not select.select([sock], [], [], 0)[0]:
+                    self.server.tick()
+                data = sock.recv(1 << 16)
+                if not data:
+                    break
+                response += data
+
+        head, _, body = response.partition(b"\r\n\r\n")
+        self.assertTrue(head.startswith(b"HTTP/1.0 200 OK"))
+        return body.decode()
+
+    def test_report(self) -> None:
+        """Clients and handshakes get reported."""
+        red = socket.create_connection(self.address)
+        blue = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+        self.addCleanup(blue.close)
+
+        red.sendall(test_utils.find_message(peer_id=BLUE, id_=RED))
+        blue.sendall(test_utils.find_message(peer_id=public_id(RED), id_=BLUE))
+        for sock in (red, blue):
+            self.readline(sock)
+
+        lines = self.scrape().splitlines()
+        self.assertIn('cable_club_clients{state="connected"} 2', lines)
+        self.assertIn("cable_club_connections_total 2", lines)
+        self.assertIn("cable_club_party_check_seconds_count 2", lines)
+        self.assertIn("cable_club_matchmaking_wait_seconds_count 1", lines)
+
+    def test_slow_scraper(self) -> None:
+        """Scrapers that do not read the response do not block the loop."""
+        if self.server.metrics_socket is None:
+            msg = "Metrics are not enabled"
+            raise AssertionError(msg)
+
+        scraper = socket.create_connection(self.server.metrics_socket.getsockname())
+        self.addCleanup(scraper.close)
+        scraper.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+        while not self.server.closing:
+            self.server.tick()
+
+        # meanwhile, trainers keep getting served
+        red = socket.create_connection(self.address)
+        self.addCleanup(red.close)
+        red.sendall(b"choose,1\n")
+        self.assertEqual(b"disconnect,not a cable_club message\n", self.readline(red))
+        self.assertIn(
+            'cable_club_disconnects_total{reason="not a cable_club message"} 1',
+            self.scrape().splitlines(),
+        )
@@ -0,0 +1,90 @@
+"""Test parsing of ``find`` messages as they come in."""
+
+import random
+import unittest
+
+from cable_club import utils as cc_utils
+from cable_club.data import models
+from cable_club.network.states import Finding, FindParser, check_find
+from cable_club.version import Version
+from test import fixtures
+from test import utils as test_utils
+
+VERSION = Version("1.0.0")
+
+INVALID = fixtures.VALID.replace(b",ARIADOS,100,", b",ARIADOS,999,")
+"""Fixture whose first Pokemon has a wrong level."""
+
+
+def feed(message: bytes, sizes: list[int]) -> tuple[Finding | str | None, int]:
+    """Feed a message in chunks, return the result and the bytes fed until then."""
+    parser = FindParser(VERSION)
+    start = 0
+    for size in sizes:
+        data = message[start : start + size]
+        start += len(data)
+        if start == len(message):
+            return parser.finish(data), start
+
+        reason = parser.feed(data)
+        if reason is not None:
+            return reason, start
+
+    return parser.finish(message[start:]), len(message)
+
+
+class FindParserTest(unittest.TestCase):
+    """Test case for FindParser."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Configure application."""
+        # do not pollute test log with warnings
+        with cc_utils.disable_warnings():
+            models.configure(test_utils.server_config())
+
+        return super().setUpClass()
+
+    def test_chunks(self) -> None:
+        """Messages fed in chunks get the same result as when fed at once."""
+        expected = check_find(fixtures.VALID, VERSION)
+        if not isinstance(expected, Finding):
+            msg = f"Fixture was rejected: {expected}"
+            raise AssertionError(msg)  # noqa: TRY004
+
+        rng = random.Random(0)  # noqa: S311
+        for _ in range(50):
+            sizes = [rng.randrange(1, 200) for _ in range(len(fixtures.VALID))]
+            result, _ = feed(fixtures.VALID, sizes)
+            if not isinstance(result, Finding):
+                msg = f"Fixture was rejected: {result}"
+                raise AssertionError(msg)  # noqa: TRY004
+
+            self.assertEqual(expected.party_raw, result.party_raw)
+            self.assertEqual(expected.name, result.name)
+            self.assertEqual(repr(expected.party), repr(result.party))
+
+    def test_early_rejection(self) -> None:
+        """Wrong fields are reported before the rest of the message comes in."""
+        result, fed = feed(INVALID, [64] * len(INVALID))
+
+        self.assertEqual("invalid party", result)
+        self.assertLess(fed, len(INVALID) // 2)
+
+    def test_not_find(self) -> None:
+        """Other messages are rejected on their first field."""
+        result, fed = feed(b"choose,1,2,3", [7, 100])
+
+        self.assertEqual("not a cable_club message", result)
+        self.assertEqual(7, fed)
+
+    def test_leftovers(self) -> None:
+        """Fields after the party are rejected, even before the message ends."""
+        result, _ = feed(fixtures.VALID + b",extra,", [len(fixtures.VALID) + 7, 1])
+        self.assertEqual("invalid party", result)
+
+    def test_incomplete(self) -> None:
+        """Messages that end too soon are rejected."""
+        end = fixtures.VALID.index(b",", len(fixtures.VALID) // 2)
+        message = fixtures.VALID[:end]
+        self.assertEqual("party's stream was incomplete.", feed(message, [100])[0])
@@ -0,0 +1,30 @@
+"""Test the timers' heap."""
+
+import unittest
+
+from cable_club.network.timers import Timers
+
+
+class TimersTest(unittest.TestCase):
+    """Test case for Timers."""
+
+    def test_run(self) -> None:
+        """Callbacks run by deadline, cancelled ones are skipped."""
+        timers = Timers()
+        calls: list[int] = []
+
+        timers.call_later(-1, lambda: calls.append(2))
+        timers.call_later(-2, lambda: calls.append(1))
+        timers.call_later(-3, lambda: calls.append(0)).cancel()
+        timers.call_later(60, lambda: calls.append(3))
+
+        self.assertEqual(0, timers.timeout())
+        timers.run()
+        self.assertEqual([1, 2], calls)
+
+        timeout = timers.timeout()
+        if timeout is None:
+            msg = "Timer got lost"
+            raise AssertionError(msg)
+        self.assertGreater(timeout, 59)
+        self.assertEqual(1, len(timers))
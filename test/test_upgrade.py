@@ -0,0 +1,155 @@
+"""Test handing the server over to a newer process."""
+
+import os
+import select
+import socket
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from typing import cast
+from unittest import mock
+
+from cable_club.network.states import Connected, public_id
+from cable_club.network.upgrade import UpgradableServer
+from test import utils as test_utils
+
+RED = 1492491670
+BLUE = 0xCAFE
+GREEN = 0xBEEF
+
+
+class UpgradableServerTest(unittest.TestCase):
+    """Test case for the handover between processes (on the same one, here)."""
+
+    def setUp(self) -> None:
+        """Start the "old" server on a random port."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        self.handoff_socket = str(Path(tmp.name) / "cable_club.sock")
+        self.config = test_utils.server_config(
+            PORT=test_utils.free_port(),
+            HANDOFF_SOCKET=self.handoff_socket,
+        )
+        self.old = UpgradableServer(self.config)
+        self.old.listen()
+        self.address = self.old.socket.getsockname()
+
+    def readline(self, server: UpgradableServer, sock: socket.socket) -> bytes:
+        """Run a server until a whole line is available on a client's socket."""
+        buffer = b""
+        while not buffer.endswith(b"\n"):
+            while not select.select([sock], [], [], 0)[0]:
+                server.tick()
+            buffer += sock.recv(4096)
+        return buffer
+
+    def test_upgrade(self) -> None:
+        """Players keep playing, and can still connect, after an upgrade."""
+        red = socket.create_connection(self.address)
+        blue = socket.create_connection(self.address)
+        green = socket.create_connection(self.address)
+        for sock in (red, blue, green):
+            self.addCleanup(sock.close)
+
+        red.sendall(test_utils.find_message(peer_id=BLUE, id_=RED))
+        blue.sendall(test_utils.find_message(peer_id=public_id(RED), id_=BLUE))
+        for sock in (red, blue):
+            self.readline(self.old, sock)
+
+        # partial messages are handed over too
+        red.sendall(b"choose,")
+        green_find = test_utils.find_message(peer_id=BLUE, id_=GREEN)
+        green.sendall(green_find[:100])
+        pending = len(b"choose,") + 100
+        while sum(len(c.recv_buffer) for c in self.old.clients.values()) < pending:
+            self.old.tick()
+
+        # the old server keeps running until everything got handed over
+        thread = threading.Thread(target=self.run_old)
+        thread.start()
+
+        new = UpgradableServer(self.config)
+        new.listen()
+        self.addCleanup(new.socket.close)
+        self.addCleanup(new.shutdown)
+
+        while new.predecessor is not None:
+            new.tick()
+        thread.join()
+
+        self.assertEqual(3, len(new.clients))
+        self.assertIsNotNone(new.upgrades)
+
+        # battle continues
+        red.sendall(b"1\n")
+        self.assertEqual(b"choose,1\n", self.readline(new, blue))
+        states = [type(client.state) for client in new.clients.values()]
+        self.assertEqual(2, states.count(Connected))
+
+        # handshake continues
+        green.sendall(green_find[100:])
+        while not new.finding:
+            new.tick()
+        self.assertEqual([(public_id(GREEN), BLUE)], list(new.finding))
+
+        # new players connect to the new server
+        yellow = socket.create_connection(self.address)
+        self.addCleanup(yellow.close)
+        while len(new.clients) < 4:  # noqa: PLR2004
+            new.tick()
+
+    def run_old(self) -> None:
+        """Tick the old server until it exits."""
+        while self.old.running:
+            self.old.tick()
+        self.old.shutdown()
+
+    def take_over(self, config: test_utils.TestConfig) -> Exception | None:
+        """Start a new server while the old one keeps running, return its error."""
+        errors: list[Exception] = []
+
+        def listen() -> None:
+            new = UpgradableServer(config)
+            try:
+                new.listen()
+            except RuntimeError as e:
+                errors.append(e)
+            else:
+                new.socket.close()
+            new.shutdown()
+
+        thread = threading.Thread(target=listen)
+        thread.start()
+        # ticking once the thread is done could block until the next timer
+        upgrades = cast(socket.socket, self.old.upgrades)
+        while thread.is_alive():
+            if select.select([upgrades], [], [], 0.01)[0]:
+                self.old.tick()
+        thread.join()
+        return errors[0] if errors else None
+
+    def test_other_address(self) -> None:
+        """A server configured with another port does not take this one over."""
+        config = test_utils.server_config(
+            PORT=test_utils.free_port(),
+            HANDOFF_SOCKET=self.handoff_socket,
+        )
+        self.assertIsInstance(self.take_over(config), RuntimeError)
+
+        # still serving, and still accepting upgrades
+        self.assertIsNone(self.old.successor)
+        self.assertIsNotNone(self.old.upgrades)
+        sock = socket.create_connection(self.address)
+        self.addCleanup(sock.close)
+        while not self.old.clients:
+            self.old.tick()
+
+    def test_other_user(self) -> None:
+        """Processes of other users are not talked to."""
+        with mock.patch.object(os, "getuid", return_value=os.getuid() + 1):
+            self.assertIsInstance(self.take_over(self.config), RuntimeError)
+
+        self.assertIsNone(self.old.successor)
+        self.assertIsNotNone(self.old.upgrades)
@@ -0,0 +1,41 @@
+"""Test formatting of outgoing messages."""
+
+import random
+import unittest
+
+from cable_club.data.writer import Writer
+
+ALPHABET = ("a", "b", ",", "\\", "é", " ")
+"""Characters the fuzzed fields are made of, biased towards the special ones."""
+
+
+class WriterTest(unittest.TestCase):
+    """Test case for Writer."""
+
+    def test_encode(self) -> None:
+        """Fields are escaped and joined into a line."""
+        writer = Writer()
+        for field in ("found", 0, "a,b", "c\\", ""):
+            writer.add(field)
+        self.assertEqual(b"found,0,a\\,b,c\\\\,\n", writer.encode())
+
+    def test_splice(self) -> None:
+        """Pre-encoded fields are sent like they would have been by add_raw."""
+        rng = random.Random(0)  # noqa: S311
+        for _ in range(1000):
+            fields = [
+                "".join(rng.choices(ALPHABET, k=rng.randrange(4)))
+                for _ in range(rng.randrange(1, 6))
+            ]
+
+            expected = Writer()
+            expected.add("found")
+            expected.add_raw(fields)
+            expected.add(1)
+
+            writer = Writer()
+            writer.add("found")
+            writer.splice(Writer.encode_fields(fields))
+            writer.add(1)
+
+            self.assertEqual(expected.encode(), writer.encode(), fields)